@@ -7,6 +7,9 @@ import traceback
 import psycopg2
 from psycopg2.extras import RealDictCursor
 from main_sse import main as main_sse_function
+from tools.events_cache import events_cache
+from tools.events_snapshot import remove_snapshot, snapshot_info, write_snapshot
+from tools.events_tool_crewai import EventsTool
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -127,7 +130,9 @@ def health():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
-        'timestamp': datetime.now().isoformat()
+        'timestamp': datetime.now().isoformat(),
+        'events_cache': events_cache.stats(),
+        'events_snapshot': snapshot_info()
     })
 
 @app.route('/', methods=['GET'])
@@ -207,6 +212,118 @@ def track_event():
         logger.error(f"Error tracking event: {e}")
         return jsonify({'error': str(e)}), 500
 
+def is_scheduler_request_authorized():
+    """Check the X-Api-Key header against SCHEDULER_API_KEY"""
+    api_key = request.headers.get('X-Api-Key')
+    expected_api_key = os.environ.get('SCHEDULER_API_KEY')
+    
+    # Skip API key check if not configured (for development/testing)
+    return not expected_api_key or api_key == expected_api_key
+
+@app.route('/api/events-cache/invalidate', methods=['POST'])
+def invalidate_events_cache():
+    """
+    Drop cached event query results, e.g. right after the EventBrite crawl.
+    Pass {"postal_code": "..."} to invalidate a single postal code (and the
+    neighbouring postal codes whose results include its events).
+
+    The events snapshot holds the same results for every subscriber postal
+    code and would keep serving them until tomorrow, so it is dropped and, if
+    there was one, rebuilt from the database.
+    """
+    if not is_scheduler_request_authorized():
+        logger.warning("Unauthorized attempt to invalidate the events cache")
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    postal_code = (request.get_json(silent=True) or {}).get('postal_code')
+    removed = EventsTool().invalidate_cache(postal_code)
+    logger.info(f"Invalidated {removed} cached event queries (postal code: {postal_code or 'all'})")
+    
+    # Dropped first, so a failed rebuild leaves lookups going to the database
+    if remove_snapshot():
+        try:
+            rebuild_events_snapshot([user['postal_code'] for user in get_all_registered_users()])
+        except Exception as e:
+            logger.warning(f"Could not rebuild the events snapshot, events are read from the database: {e}")
+    
+    return jsonify({
+        'status': 'invalidated',
+        'removed': removed,
+        'events_cache': events_cache.stats(),
+        'events_snapshot': snapshot_info()
+    })
+
+def rebuild_events_snapshot(postal_codes, days_back=7):
+    """Fetch the events of the given postal codes in one query and write today's shared snapshot"""
+    events_by_postal_code = EventsTool().fetch_events_for_postal_codes(postal_codes, days_back)
+    try:
+        written = write_snapshot(events_by_postal_code, datetime.now().date(), days_back)
+        logger.info(f"Wrote events snapshot for {written} postal codes")
+    except OSError as e:
+        logger.warning(f"Could not write events snapshot: {e}")
+    return events_by_postal_code
+
+@app.route('/api/events-snapshot/rebuild', methods=['POST'])
+def rebuild_events_snapshot_endpoint():
+    """
+    Write today's events snapshot for every subscriber postal code, e.g. right
+    after the EventBrite crawl. All workers pick the new file up on their next
+    lookup.
+    """
+    if not is_scheduler_request_authorized():
+        logger.warning("Unauthorized attempt to rebuild the events snapshot")
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    try:
+        users = get_all_registered_users()
+        rebuild_events_snapshot([user['postal_code'] for user in users])
+        return jsonify({
+            'status': 'rebuilt',
+            'events_snapshot': snapshot_info()
+        })
+    except Exception as e:
+        logger.error(f"Error rebuilding events snapshot: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/prefetch-weather', methods=['POST'])
+def prefetch_weather():
+    """
+    Warm the weather server's gridpoint, forecast and hourly forecast caches for every distinct
+    subscriber location. Schedule it shortly before the 7 AM CT daily run so the
+    run's batch forecast call is served from cache. Returns the prefetch
+    coverage and staleness reported by the server.
+    """
+    if not is_scheduler_request_authorized():
+        logger.warning("Unauthorized attempt to prefetch weather")
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    try:
+        users = get_all_registered_users()
+        # Same rounding as the daily run, so both hit the same cache entries
+        locations = sorted({
+            (round(float(user['latitude']), 4), round(float(user['longitude']), 4))
+            for user in users
+            if user['latitude'] is not None and user['longitude'] is not None
+        })
+        
+        from tools.weather_tool_sse import MCPSSEWeatherTool
+        report = MCPSSEWeatherTool().prefetch_forecasts(locations) if locations else {}
+        if 'error' in report:
+            logger.error(f"Weather prefetch failed: {report['error']}")
+            return jsonify({'status': 'error', 'error': report['error']}), 502
+        
+        logger.info(f"Prefetched weather for {len(locations)} subscriber locations: {report}")
+        return jsonify({
+            'status': 'completed',
+            'timestamp': datetime.now().isoformat(),
+            'total_users': len(users),
+            'locations': len(locations),
+            'prefetch': report
+        })
+    except Exception as e:
+        logger.error(f"Error prefetching weather: {e}")
+        return jsonify({'error': str(e)}), 500
+
 # New endpoint for scheduled daily recommendations
 @app.route('/api/run-daily-recommendations', methods=['POST'])
 def run_daily_recommendations():
@@ -215,11 +332,7 @@ def run_daily_recommendations():
     This can be secured with API keys to ensure only authorized services can call it
     """
     # Verify the request with an API key
-    api_key = request.headers.get('X-Api-Key')
-    expected_api_key = os.environ.get('SCHEDULER_API_KEY')
-    
-    # Skip API key check if not configured (for development/testing)
-    if expected_api_key and (not api_key or api_key != expected_api_key):
+    if not is_scheduler_request_authorized():
         logger.warning("Unauthorized attempt to access scheduled recommendations endpoint")
         return jsonify({'error': 'Unauthorized'}), 401
     
@@ -236,6 +349,33 @@ def run_daily_recommendations():
         
         logger.info(f"Starting daily recommendations for {len(users)} users")
         
+        # Fetch today's and the past week's events for every user's postal code in one query,
+        # and share them with the other workers through the events snapshot
+        try:
+            events_by_postal_code = rebuild_events_snapshot([user['postal_code'] for user in users], 7)
+            logger.info(f"Prefetched events for {len(events_by_postal_code)} postal codes")
+        except Exception as e:
+            logger.warning(f"Could not prefetch events, falling back to per-user queries: {e}")
+            events_by_postal_code = {}
+        
+        # Fetch every located user's forecast in one batch call; users in the
+        # same NWS grid square share one upstream request on the server
+        located_users = [user for user in users if user['latitude'] is not None and user['longitude'] is not None]
+        try:
+            from tools.weather_tool_sse import MCPSSEWeatherTool
+            forecasts = MCPSSEWeatherTool().get_forecasts([
+                (round(float(user['latitude']), 4), round(float(user['longitude']), 4)) for user in located_users
+            ]) if located_users else []
+            weather_by_user = {
+                user['id']: forecast
+                for user, forecast in zip(located_users, forecasts)
+                if not forecast.startswith("Error")
+            }
+            logger.info(f"Prefetched weather for {len(weather_by_user)} of {len(users)} users")
+        except Exception as e:
+            logger.warning(f"Could not prefetch weather, falling back to per-user calls: {e}")
+            weather_by_user = {}
+        
         results = []
         successful = 0
         failed = 0
@@ -254,7 +394,11 @@ def run_daily_recommendations():
                 }
                 
                 # Generate recommendations using existing function
-                recommendation = main_sse_function(user_data)
+                recommendation = main_sse_function(
+                    user_data,
+                    prefetched_events=events_by_postal_code.get(str(user['postal_code'])),
+                    prefetched_weather=weather_by_user.get(user['id'])
+                )
                 
                 # Send email with recommendations
                 from tools.email_tool import send_recommendation_email
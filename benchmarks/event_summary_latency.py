@@ -0,0 +1,49 @@
+"""
+Compare event summary read latency: the pre-aggregated event_daily_summary
+table against aggregating raw `events` rows.
+
+Usage:
+    python benchmarks/event_summary_latency.py [postal_code] [iterations]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.events_tool_crewai import EventsTool
+
+
+def _percentile(timings, percent):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+async def run_benchmark(postal_code, iterations):
+    tool = EventsTool()
+    try:
+        for label, from_summary_table in (("raw events aggregation", False), ("daily summary table", True)):
+            # Warm up the pool and the server-side plan cache
+            summary = await tool._query_event_summary_async(postal_code, from_summary_table=from_summary_table)
+
+            timings = []
+            for _ in range(iterations):
+                started = time.perf_counter()
+                await tool._query_event_summary_async(postal_code, from_summary_table=from_summary_table)
+                timings.append((time.perf_counter() - started) * 1000)
+
+            print(
+                f"{label:<24} mean {statistics.mean(timings):7.2f} ms  "
+                f"p50 {_percentile(timings, 50):7.2f} ms  p95 {_percentile(timings, 95):7.2f} ms  "
+                f"(window_count={summary.window_count})"
+            )
+    finally:
+        await tool.close()
+
+
+if __name__ == "__main__":
+    postal_code = sys.argv[1] if len(sys.argv) > 1 else "66213"
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    asyncio.run(run_benchmark(postal_code, iterations))
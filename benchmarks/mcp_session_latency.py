@@ -0,0 +1,62 @@
+"""
+Compare weather tool call latency over a fresh MCP connection per call (SSE
+stream + initialize handshake each time) against pooled, already-initialized
+sessions.
+
+Usage:
+    python benchmarks/mcp_session_latency.py [server_url] [iterations]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.mcp_session_pool import MCPSessionPool
+from tools.weather_tool_sse import MCPSSEWeatherTool
+
+ARGS = {"latitude": 38.9592, "longitude": -94.7168}
+
+
+def _percentile(timings, percent):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+def _report(label, timings):
+    print(
+        f"{label:<20} mean {statistics.mean(timings):8.1f} ms  "
+        f"p50 {_percentile(timings, 50):8.1f} ms  p95 {_percentile(timings, 95):8.1f} ms"
+    )
+
+
+async def run_benchmark(server_url, iterations):
+    tool = MCPSSEWeatherTool(server_url=server_url)
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        await tool._call_tool_with_fresh_connection("get_forecast", ARGS)
+        timings.append((time.perf_counter() - started) * 1000)
+    _report("fresh connection", timings)
+
+    pool = MCPSessionPool(server_url, size=1)
+    try:
+        # The first call pays the connection and handshake once
+        await pool.call_tool_async("get_forecast", ARGS)
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            await pool.call_tool_async("get_forecast", ARGS)
+            timings.append((time.perf_counter() - started) * 1000)
+        _report("pooled session", timings)
+        print(pool.stats())
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    server_url = sys.argv[1] if len(sys.argv) > 1 else "https://ptk4g7rrkh.us-east-2.awsapprunner.com"
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    asyncio.run(run_benchmark(server_url, iterations))
@@ -0,0 +1,107 @@
+"""
+Keyword-based event categorization used at ingest.
+
+All category keywords are compiled once into a single Aho-Corasick automaton,
+so classifying an event is one pass over its name and summary no matter how
+many keywords there are.
+"""
+from collections import deque
+
+DEFAULT_CATEGORY = 'Other'
+
+# Category -> keywords. Earlier categories win ties.
+CATEGORY_KEYWORDS = {
+    'Food/Beverage': [
+        'food', 'dinner', 'brunch', 'lunch', 'breakfast', 'tasting', 'wine', 'beer', 'brewery',
+        'brewing', 'cocktail', 'coffee', 'sip', 'chef', 'cooking', 'bbq', 'barbecue', 'happy hour',
+    ],
+    'Entertainment/Gaming': [
+        'scavenger hunt', 'escape room', 'tour', 'trivia', 'game', 'gaming', 'comedy', 'show',
+        'movie', 'film', 'magic', 'puzzle', 'bingo', 'karaoke',
+    ],
+    'Music': ['concert', 'live music', 'band', 'dj', 'jazz', 'orchestra', 'symphony', 'open mic'],
+    'Professional': [
+        'training', 'workshop', 'leadership', 'networking', 'conference', 'seminar', 'webinar',
+        'career', 'business', 'ai', 'summit', 'certification', 'entrepreneur', 'marketing', 'investing',
+    ],
+    'Social': [
+        'date night', 'singles', 'matchmaking', 'speed dating', 'mixer', 'meetup', 'party',
+        'social', 'dance', 'dancing',
+    ],
+    'Arts/Crafts': ['art', 'paint', 'painting', 'glaze', 'pottery', 'craft', 'gallery', 'theater', 'theatre'],
+    'Fitness/Wellness': ['yoga', 'fitness', 'run', '5k', 'workout', 'meditation', 'wellness', 'pilates'],
+    'Family/Kids': ['kids', 'family', 'children', 'storytime', 'toddler', 'teen'],
+    'Community': ['market', 'festival', 'fair', 'volunteer', 'fundraiser', 'charity', 'parade'],
+}
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton over lowercase keywords, reporting whole-word matches."""
+
+    def __init__(self, keywords):
+        # keywords: iterable of (keyword, label)
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+        for keyword, label in keywords:
+            state = 0
+            for char in keyword.lower():
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append((len(keyword), label))
+
+        # Breadth-first pass to compute failure links and merge outputs
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def matches(self, text):
+        """Yield the label of every keyword occurring in `text` as a whole word"""
+        text = text.lower()
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for length, label in self._output[state]:
+                start = position - length + 1
+                before_ok = start == 0 or not text[start - 1].isalnum()
+                after_ok = position + 1 == len(text) or not text[position + 1].isalnum()
+                if before_ok and after_ok:
+                    yield label
+
+
+_automaton = KeywordAutomaton(
+    (keyword, category)
+    for category, keywords in CATEGORY_KEYWORDS.items()
+    for keyword in keywords
+)
+_priority = {category: index for index, category in enumerate(CATEGORY_KEYWORDS)}
+
+
+def categorize_event(name, summary=''):
+    """Return the category whose keywords occur most often in the event's name and summary"""
+    counts = {}
+    # Keywords in the name count double
+    for category in _automaton.matches(name or ''):
+        counts[category] = counts.get(category, 0) + 2
+    for category in _automaton.matches(summary or ''):
+        counts[category] = counts.get(category, 0) + 1
+
+    if not counts:
+        return DEFAULT_CATEGORY
+    return min(counts, key=lambda category: (-counts[category], _priority[category]))
@@ -0,0 +1,189 @@
+"""
+One-off migration for the derived columns, indexes and tables maintained at ingest.
+
+Run it once before deploying code that relies on them, and again whenever a
+statement is added here (every step is idempotent):
+
+    python event_schema.py
+
+or invoke the Lambda with {"migrate_schema": true}.
+
+The crawl itself runs no DDL. `ALTER TABLE` takes an ACCESS EXCLUSIVE lock on
+`events` even when the column already exists, and inside the ingest
+transaction that lock would block every app read until the commit. So the
+migration runs in autocommit mode:
+
+- columns are only added when they are missing, so an up-to-date table is
+  never locked (adding the generated search_vector column rewrites the table
+  once);
+- indexes are built with CREATE INDEX CONCURRENTLY, so reads and writes carry
+  on during the build;
+- a lock timeout makes an ALTER give up, instead of queueing behind long
+  reads and blocking every later read behind it.
+"""
+import logging
+
+logger = logging.getLogger()
+
+# Grid cell size in degrees of the event_density index (~2.2 km north-south);
+# must match DENSITY_CELL_DEGREES in tools/events_tool_crewai.py. When it
+# changes, rename events_start_date_density_cell_idx, move the old name to
+# OBSOLETE_INDEXES and run {"rebuild_summary": true} after the migration.
+DENSITY_CELL_DEGREES = 0.02
+
+EVENT_DAILY_SUMMARY_DDL = """
+    CREATE TABLE IF NOT EXISTS event_daily_summary (
+        postal_code INTEGER NOT NULL,
+        day DATE NOT NULL,
+        event_count INTEGER NOT NULL,
+        online_count INTEGER NOT NULL,
+        venue_counts JSONB NOT NULL,
+        top_events JSONB NOT NULL,
+        category_counts JSONB NOT NULL DEFAULT '{}'::jsonb,
+        refreshed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (postal_code, day)
+    )
+"""
+
+# Mean and standard deviation of daily event counts per postal code, over all
+# days of the window ('day'), the days falling on each ISO weekday
+# ('weekday', key '1'..'7') and per category ('category', key = category).
+EVENT_BASELINES_DDL = """
+    CREATE TABLE IF NOT EXISTS event_baselines (
+        postal_code INTEGER NOT NULL,
+        window_days INTEGER NOT NULL,
+        dimension TEXT NOT NULL,
+        key TEXT NOT NULL,
+        sample_count INTEGER NOT NULL,
+        mean DOUBLE PRECISION NOT NULL,
+        stddev DOUBLE PRECISION NOT NULL,
+        as_of DATE NOT NULL,
+        PRIMARY KEY (postal_code, window_days, dimension, key)
+    )
+"""
+
+# Events (and expected attendance) per grid cell per local hour of each day.
+# An event counts in every hour it runs.
+EVENT_DENSITY_DDL = """
+    CREATE TABLE IF NOT EXISTS event_density (
+        day DATE NOT NULL,
+        cell_row INTEGER NOT NULL,
+        cell_col INTEGER NOT NULL,
+        hour SMALLINT NOT NULL,
+        event_count INTEGER NOT NULL,
+        expected_attendance INTEGER NOT NULL,
+        PRIMARY KEY (day, cell_row, cell_col, hour)
+    )
+"""
+
+TABLE_DDL = [EVENT_DAILY_SUMMARY_DDL, EVENT_BASELINES_DDL, EVENT_DENSITY_DDL]
+
+# (table, column, definition) of the columns added to existing tables
+COLUMN_DDL = [
+    # Full-text search over event names and summaries, computed by Postgres
+    # whenever a row is inserted or updated
+    ("events", "search_vector", """tsvector GENERATED ALWAYS AS (
+        to_tsvector('english', COALESCE(name, '') || ' ' || COALESCE(summary, ''))
+    ) STORED"""),
+    # Category assigned at ingest by event_categories.categorize_event
+    ("events", "category", "TEXT"),
+    ("event_daily_summary", "category_counts", "JSONB NOT NULL DEFAULT '{}'::jsonb"),
+    # Where and when events run, for the density index
+    ("events", "start_at", "TIMESTAMP"),
+    ("events", "end_at", "TIMESTAMP"),
+    ("events", "latitude", "DOUBLE PRECISION"),
+    ("events", "longitude", "DOUBLE PRECISION"),
+    ("events", "expected_attendance", "INTEGER"),
+]
+
+# (index name, definition), built concurrently
+INDEX_DDL = [
+    ("events_search_vector_idx", "ON events USING GIN (search_vector)"),
+    ("events_postal_code_date_category_idx", "ON events (postal_code, start_date, category)"),
+    ("events_start_date_density_cell_idx", f"""ON events (
+        start_date,
+        (floor(latitude / {DENSITY_CELL_DEGREES})::int),
+        (floor(longitude / {DENSITY_CELL_DEGREES})::int)
+    )"""),
+]
+
+# Indexes replaced by one of INDEX_DDL, dropped concurrently once it is built
+OBSOLETE_INDEXES = [
+    # Keyed on the former 0.1 degree density cells
+    "events_start_date_cell_idx",
+]
+
+
+def _existing_columns(cursor, table):
+    cursor.execute("""
+        SELECT column_name
+        FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = %s
+    """, (table,))
+    return {name for name, in cursor.fetchall()}
+
+
+def _drop_invalid_index(cursor, name):
+    """Drop an index left invalid by an interrupted concurrent build, so it is built again"""
+    cursor.execute("""
+        SELECT NOT i.indisvalid
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s AND c.relnamespace = current_schema()::regnamespace
+    """, (name,))
+    row = cursor.fetchone()
+    if row and row[0]:
+        logger.info(f"Dropping invalid index {name}")
+        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+def migrate_event_schema(conn, lock_timeout='5s'):
+    """Create the missing tables, columns and indexes and drop obsolete ones; returns the steps applied"""
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    conn.autocommit = True
+    cursor = conn.cursor()
+    applied = []
+    try:
+        cursor.execute(f"SET lock_timeout = '{lock_timeout}'")
+        for statement in TABLE_DDL:
+            cursor.execute(statement)
+
+        for table, column, definition in COLUMN_DDL:
+            if column not in _existing_columns(cursor, table):
+                logger.info(f"Adding column {table}.{column}")
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {definition}")
+                applied.append(f"column {table}.{column}")
+
+        # Concurrent builds block neither reads nor writes, but wait for older transactions
+        cursor.execute("RESET lock_timeout")
+        for name, definition in INDEX_DDL:
+            _drop_invalid_index(cursor, name)
+            cursor.execute("SELECT to_regclass(%s) IS NULL", (name,))
+            if cursor.fetchone()[0]:
+                logger.info(f"Building index {name}")
+                cursor.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} {definition}")
+                applied.append(f"index {name}")
+
+        for name in OBSOLETE_INDEXES:
+            cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (name,))
+            if cursor.fetchone()[0]:
+                logger.info(f"Dropping obsolete index {name}")
+                cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+                applied.append(f"drop index {name}")
+    finally:
+        cursor.close()
+
+    logger.info(f"Event schema migration applied {len(applied)} steps")
+    return applied
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    from lambda_function import get_db_connection
+
+    connection = get_db_connection()
+    try:
+        for step in migrate_event_schema(connection):
+            print(f"Applied {step}")
+    finally:
+        connection.close()
@@ -10,6 +10,9 @@ import random
 import logging
 from datetime import datetime
 
+from event_categories import CATEGORY_KEYWORDS, DEFAULT_CATEGORY, categorize_event
+from event_schema import DENSITY_CELL_DEGREES, migrate_event_schema
+
 # Set up logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -38,6 +41,279 @@ def get_db_connection():
         logger.error(f"Database connection error: {e}")
         raise e
 
+# Number of event names kept per (postal_code, day) in the summary table
+SUMMARY_TOP_EVENTS = 10
+
+# Hour bucket for events listed without a start time
+UNTIMED_HOUR = -1
+# Assumed length of events listed without an end time
+DEFAULT_EVENT_HOURS = 2
+# Attendance assumed for events that do not state a capacity
+DEFAULT_EXPECTED_ATTENDANCE = int(os.environ.get('DEFAULT_EXPECTED_ATTENDANCE', '25'))
+
+# Trailing windows (in days, excluding today) the per-postal-code baselines cover
+BASELINE_WINDOWS = [7, 30]
+# Weekday baselines only for windows with at least two of each weekday; a
+# 7-day window holds a single Monday, which is not a baseline
+WEEKDAY_BASELINE_MIN_WINDOW_DAYS = 14
+
+def migrate_schema():
+    """Apply the one-off event schema migration (see event_schema.py)"""
+    conn = get_db_connection()
+    try:
+        return migrate_event_schema(conn)
+    finally:
+        conn.close()
+
+def categorize_uncategorized_events(cursor, batch_size=1000):
+    """Assign a category to events stored before categorization existed"""
+    categorized = 0
+    while True:
+        cursor.execute("""
+            SELECT eid, name, summary
+            FROM events
+            WHERE category IS NULL AND eid IS NOT NULL
+            LIMIT %s
+        """, (batch_size,))
+        rows = cursor.fetchall()
+        if not rows:
+            return categorized
+        
+        eids = [eid for eid, _, _ in rows]
+        categories = [categorize_event(name, summary) for _, name, summary in rows]
+        cursor.execute("""
+            UPDATE events e
+            SET category = k.category
+            FROM unnest(%s::text[], %s::text[]) AS k(eid, category)
+            WHERE e.eid::text = k.eid
+        """, (eids, categories))
+        categorized += len(rows)
+
+def refresh_event_daily_summary(cursor, keys):
+    """Recompute the event_daily_summary rows for the given (postal_code, day) pairs"""
+    keys = [(postal_code, day) for postal_code, day in set(keys) if postal_code is not None and day is not None]
+    if not keys:
+        return 0
+    
+    postal_codes = [postal_code for postal_code, _ in keys]
+    days = [day for _, day in keys]
+    
+    # Drop rows whose events are gone, then rebuild the rest from the events table
+    cursor.execute("""
+        DELETE FROM event_daily_summary s
+        USING unnest(%s::int[], %s::date[]) AS k(postal_code, day)
+        WHERE s.postal_code = k.postal_code AND s.day = k.day
+    """, (postal_codes, days))
+    cursor.execute("""
+        INSERT INTO event_daily_summary (
+            postal_code, day, event_count, online_count,
+            venue_counts, top_events, category_counts, refreshed_at
+        )
+        SELECT
+            e.postal_code,
+            e.start_date,
+            count(*),
+            count(*) FILTER (WHERE e.is_online_event),
+            COALESCE((
+                SELECT jsonb_object_agg(venue_name, n)
+                FROM (
+                    SELECT venue_name, count(*) AS n
+                    FROM events v
+                    WHERE v.postal_code = e.postal_code AND v.start_date = e.start_date
+                    AND COALESCE(v.venue_name, '') <> ''
+                    GROUP BY venue_name
+                ) venues
+            ), '{}'::jsonb),
+            COALESCE((
+                SELECT jsonb_agg(name ORDER BY name)
+                FROM (
+                    SELECT name
+                    FROM events t
+                    WHERE t.postal_code = e.postal_code AND t.start_date = e.start_date
+                    ORDER BY name
+                    LIMIT %s
+                ) top
+            ), '[]'::jsonb),
+            COALESCE((
+                SELECT jsonb_object_agg(category, n)
+                FROM (
+                    SELECT COALESCE(c.category, %s) AS category, count(*) AS n
+                    FROM events c
+                    WHERE c.postal_code = e.postal_code AND c.start_date = e.start_date
+                    GROUP BY 1
+                ) categories
+            ), '{}'::jsonb),
+            CURRENT_TIMESTAMP
+        FROM events e
+        JOIN unnest(%s::int[], %s::date[]) AS k(postal_code, day)
+            ON e.postal_code = k.postal_code AND e.start_date = k.day
+        GROUP BY e.postal_code, e.start_date
+        ON CONFLICT (postal_code, day)
+        DO UPDATE SET
+            event_count = EXCLUDED.event_count,
+            online_count = EXCLUDED.online_count,
+            venue_counts = EXCLUDED.venue_counts,
+            top_events = EXCLUDED.top_events,
+            category_counts = EXCLUDED.category_counts,
+            refreshed_at = EXCLUDED.refreshed_at
+    """, (SUMMARY_TOP_EVENTS, DEFAULT_CATEGORY, postal_codes, days))
+    
+    logger.info(f"Refreshed event_daily_summary for {len(keys)} (postal_code, day) pairs")
+    return len(keys)
+
+def refresh_event_baselines(cursor, postal_codes):
+    """
+    Recompute the rolling baselines of the given postal codes from
+    event_daily_summary.
+    
+    Only the postal codes touched by a crawl are refreshed, and each one reads
+    at most max(BASELINE_WINDOWS) summary rows, so the cost does not grow with
+    the number of stored events. Days without a summary row since the postal
+    code was first crawled count as zero. The postal codes' previous rows are
+    replaced, so baselines no longer computed do not linger.
+    """
+    postal_codes = sorted({postal_code for postal_code in postal_codes if postal_code is not None})
+    if not postal_codes:
+        return 0
+    
+    categories = list(CATEGORY_KEYWORDS) + [DEFAULT_CATEGORY]
+    cursor.execute("DELETE FROM event_baselines WHERE postal_code = ANY(%s::int[])", (postal_codes,))
+    cursor.execute("""
+        WITH windows AS (
+            SELECT unnest(%s::int[]) AS window_days
+        ),
+        daily AS (
+            SELECT k.postal_code, d.day::date AS day,
+                COALESCE(s.event_count, 0) AS event_count,
+                COALESCE(s.category_counts, '{}'::jsonb) AS category_counts
+            FROM unnest(%s::int[]) AS k(postal_code)
+            CROSS JOIN generate_series(CURRENT_DATE - (SELECT max(window_days) FROM windows), CURRENT_DATE - 1, interval '1 day') AS d(day)
+            LEFT JOIN event_daily_summary s
+                ON s.postal_code = k.postal_code AND s.day = d.day::date
+            -- Days before the postal code was first crawled are not samples
+            WHERE d.day >= (SELECT min(f.day) FROM event_daily_summary f WHERE f.postal_code = k.postal_code)
+        ),
+        samples AS (
+            SELECT postal_code, window_days, 'day' AS dimension, '' AS key, event_count::float8 AS value
+            FROM daily JOIN windows ON daily.day >= CURRENT_DATE - windows.window_days
+            UNION ALL
+            SELECT postal_code, window_days, 'weekday', extract(isodow FROM day)::int::text, event_count::float8
+            FROM daily JOIN windows ON daily.day >= CURRENT_DATE - windows.window_days
+            WHERE windows.window_days >= %s
+            UNION ALL
+            SELECT postal_code, window_days, 'category', c.category, COALESCE((category_counts ->> c.category)::float8, 0)
+            FROM daily JOIN windows ON daily.day >= CURRENT_DATE - windows.window_days
+            CROSS JOIN unnest(%s::text[]) AS c(category)
+        )
+        INSERT INTO event_baselines (postal_code, window_days, dimension, key, sample_count, mean, stddev, as_of)
+        SELECT postal_code, window_days, dimension, key, count(*), avg(value), stddev_pop(value), CURRENT_DATE
+        FROM samples
+        GROUP BY postal_code, window_days, dimension, key
+        ON CONFLICT (postal_code, window_days, dimension, key)
+        DO UPDATE SET
+            sample_count = EXCLUDED.sample_count,
+            mean = EXCLUDED.mean,
+            stddev = EXCLUDED.stddev,
+            as_of = EXCLUDED.as_of
+    """, (BASELINE_WINDOWS, postal_codes, WEEKDAY_BASELINE_MIN_WINDOW_DAYS, categories))
+    
+    logger.info(f"Refreshed event_baselines for {len(postal_codes)} postal codes")
+    return len(postal_codes)
+
+def refresh_event_density(cursor, keys):
+    """Recompute the event_density rows of the given (day, cell_row, cell_col) cells"""
+    keys = [key for key in set(keys) if None not in key]
+    if not keys:
+        return 0
+    
+    days = [day for day, _, _ in keys]
+    rows = [cell_row for _, cell_row, _ in keys]
+    cols = [cell_col for _, _, cell_col in keys]
+    
+    cursor.execute("""
+        DELETE FROM event_density d
+        USING unnest(%s::date[], %s::int[], %s::int[]) AS k(day, cell_row, cell_col)
+        WHERE d.day = k.day AND d.cell_row = k.cell_row AND d.cell_col = k.cell_col
+    """, (days, rows, cols))
+    cursor.execute(f"""
+        INSERT INTO event_density (day, cell_row, cell_col, hour, event_count, expected_attendance)
+        SELECT k.day, k.cell_row, k.cell_col, h.hour, count(*), sum(COALESCE(e.expected_attendance, %s))
+        FROM unnest(%s::date[], %s::int[], %s::int[]) AS k(day, cell_row, cell_col)
+        JOIN events e
+            ON e.start_date = k.day
+            AND floor(e.latitude / {DENSITY_CELL_DEGREES})::int = k.cell_row
+            AND floor(e.longitude / {DENSITY_CELL_DEGREES})::int = k.cell_col
+        CROSS JOIN LATERAL generate_series(
+            COALESCE(extract(hour FROM e.start_at)::int, %s),
+            CASE
+                WHEN e.start_at IS NULL THEN %s
+                WHEN e.end_at IS NULL OR e.end_at <= e.start_at
+                    THEN LEAST(23, extract(hour FROM e.start_at)::int + %s - 1)
+                WHEN e.end_at::date > e.start_at::date THEN 23
+                ELSE extract(hour FROM e.end_at - interval '1 second')::int
+            END
+        ) AS h(hour)
+        GROUP BY k.day, k.cell_row, k.cell_col, h.hour
+    """, (DEFAULT_EXPECTED_ATTENDANCE, days, rows, cols, UNTIMED_HOUR, UNTIMED_HOUR, DEFAULT_EVENT_HOURS))
+    
+    logger.info(f"Refreshed event_density for {len(keys)} (day, cell) pairs")
+    return len(keys)
+
+def parse_event_time(value):
+    """Parse a JSON-LD date-time into local wall-clock time; None for a date without a time"""
+    if not value or 'T' not in value:
+        return None
+    try:
+        # Keep the event's local time; the UTC offset is not needed for hour buckets
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+def parse_coordinate(value):
+    """Parse a JSON-LD latitude/longitude, which may be a string or a number"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def rebuild_event_daily_summary(days_back=30):
+    """Backfill event_daily_summary for every postal code over the last `days_back` days"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        categorized = categorize_uncategorized_events(cursor)
+        if categorized:
+            logger.info(f"Categorized {categorized} existing events")
+        cursor.execute("""
+            SELECT DISTINCT postal_code, start_date
+            FROM events
+            WHERE start_date >= CURRENT_DATE - %s
+        """, (days_back,))
+        keys = cursor.fetchall()
+        refreshed = refresh_event_daily_summary(cursor, keys)
+        refresh_event_baselines(cursor, [postal_code for postal_code, _ in keys])
+        # Rows of cells that no longer exist (e.g. after a cell size change) are not refreshed below
+        cursor.execute("DELETE FROM event_density WHERE day >= CURRENT_DATE - %s", (days_back,))
+        cursor.execute(f"""
+            SELECT DISTINCT start_date,
+                floor(latitude / {DENSITY_CELL_DEGREES})::int,
+                floor(longitude / {DENSITY_CELL_DEGREES})::int
+            FROM events
+            WHERE start_date >= CURRENT_DATE - %s
+            AND latitude IS NOT NULL AND longitude IS NOT NULL
+        """, (days_back,))
+        refresh_event_density(cursor, cursor.fetchall())
+        conn.commit()
+        return refreshed
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error rebuilding event summary: {e}")
+        raise e
+    finally:
+        cursor.close()
+        conn.close()
+
 def save_events_to_db(events):
     """Save events to the PostgreSQL database"""
     if not events:
@@ -47,6 +323,10 @@ def save_events_to_db(events):
     conn = get_db_connection()
     cursor = conn.cursor()
     saved_count = 0
+    # (postal_code, day) pairs touched by this batch, before and after, for the summary refresh
+    summary_keys = set()
+    # (day, cell_row, cell_col) cells touched by this batch, before and after, for the density refresh
+    density_keys = set()
     
     try:
         for event in events:
@@ -60,31 +340,73 @@ def save_events_to_db(events):
             except (ValueError, AttributeError):
                 postal_code = None
             
-            # Insert the event - modified to match your actual schema
-            cursor.execute("""
-                INSERT INTO events (
-                    eid, name, summary, start_date,
-                    is_online_event, venue_name, postal_code
+            # Insert the event - modified to match your actual schema. The CTE reads
+            # the row as it was before the upsert, so an event that moved to another
+            # postal code, day or cell refreshes both its old and new summary rows.
+            cursor.execute(f"""
+                WITH previous AS (
+                    SELECT postal_code, start_date,
+                        floor(latitude / {DENSITY_CELL_DEGREES})::int AS cell_row,
+                        floor(longitude / {DENSITY_CELL_DEGREES})::int AS cell_col
+                    FROM events
+                    WHERE eid = %s
+                ),
+                saved AS (
+                    INSERT INTO events (
+                        eid, name, summary, start_date,
+                        is_online_event, venue_name, postal_code, category,
+                        start_at, end_at, latitude, longitude, expected_attendance
+                    )
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    ON CONFLICT (eid) 
+                    DO UPDATE SET 
+                        name = EXCLUDED.name,
+                        summary = EXCLUDED.summary,
+                        start_date = EXCLUDED.start_date,
+                        is_online_event = EXCLUDED.is_online_event,
+                        venue_name = EXCLUDED.venue_name,
+                        postal_code = EXCLUDED.postal_code,
+                        category = EXCLUDED.category,
+                        start_at = EXCLUDED.start_at,
+                        end_at = EXCLUDED.end_at,
+                        latitude = EXCLUDED.latitude,
+                        longitude = EXCLUDED.longitude,
+                        expected_attendance = EXCLUDED.expected_attendance
+                    RETURNING postal_code, start_date,
+                        floor(latitude / {DENSITY_CELL_DEGREES})::int AS cell_row,
+                        floor(longitude / {DENSITY_CELL_DEGREES})::int AS cell_col
                 )
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (eid) 
-                DO UPDATE SET 
-                    name = EXCLUDED.name,
-                    summary = EXCLUDED.summary,
-                    start_date = EXCLUDED.start_date,
-                    is_online_event = EXCLUDED.is_online_event,
-                    venue_name = EXCLUDED.venue_name,
-                    postal_code = EXCLUDED.postal_code
+                SELECT s.postal_code, s.start_date, s.cell_row, s.cell_col,
+                    p.postal_code, p.start_date, p.cell_row, p.cell_col
+                FROM saved s
+                LEFT JOIN previous p ON true
             """, (
+                event.get('eid', ''),
                 event.get('eid', ''),
                 event.get('name', ''),
                 event.get('summary', ''),
                 event.get('start_date', ''),
                 event.get('is_online_event', False),
                 venue_name,
-                postal_code  # Now using the converted integer value
+                postal_code,  # Now using the converted integer value
+                categorize_event(event.get('name', ''), event.get('summary', '')),
+                parse_event_time(event.get('start_date', '')),
+                parse_event_time(event.get('end_date', '')),
+                parse_coordinate(event.get('latitude')),
+                parse_coordinate(event.get('longitude')),
+                event.get('expected_attendance')
             ))
+            row = cursor.fetchone()
+            for postal_code, start_date, cell_row, cell_col in (row[:4], row[4:]):
+                # The previous key is all NULL for a new event; the refreshes skip it
+                summary_keys.add((postal_code, start_date))
+                density_keys.add((start_date, cell_row, cell_col))
             saved_count += 1
+        
+        # Keep the per-postal-code daily summary and baselines in step with the events
+        refresh_event_daily_summary(cursor, summary_keys)
+        refresh_event_baselines(cursor, [postal_code for postal_code, _ in summary_keys])
+        refresh_event_density(cursor, density_keys)
             
         # Commit the transaction
         conn.commit()
@@ -159,6 +481,9 @@ def get_eventbrite_data(location_code=66213, max_pages=5):
                                     # Get address details
                                     address = location.get('address', {}) if isinstance(location, dict) else {}
                                     postal_code = address.get('postalCode', '') if isinstance(address, dict) else ''
+                                    geo = location.get('geo', {}) if isinstance(location, dict) else {}
+                                    geo = geo if isinstance(geo, dict) else {}
+                                    capacity = event_info.get('maximumAttendeeCapacity')
                                     
                                     # Try to extract IDs from URLs
                                     url = event_info.get('url', '')
@@ -180,7 +505,10 @@ def get_eventbrite_data(location_code=66213, max_pages=5):
                                         'primary_venue': {
                                             'name': location.get('name', '') if isinstance(location, dict) else ''
                                         },
-                                        'postal_code': postal_code
+                                        'postal_code': postal_code,
+                                        'latitude': geo.get('latitude'),
+                                        'longitude': geo.get('longitude'),
+                                        'expected_attendance': int(capacity) if str(capacity).isdigit() else None
                                     }
                                     events_from_jsonld.append(event_data)
                             
@@ -305,6 +633,28 @@ def lambda_handler(event, context):
         max_pages = event.get('max_pages', 5)
         skip_db = event.get('skip_db', False)  # Optional flag to skip database operations
         
+        # One-off schema migration, run before deploying code that needs it
+        if event.get('migrate_schema', False):
+            applied = migrate_schema()
+            return {
+                'statusCode': 200,
+                'body': json.dumps({
+                    'message': 'Schema migrated',
+                    'applied': applied
+                })
+            }
+        
+        # Optional one-off backfill of the daily summary table instead of a crawl
+        if event.get('rebuild_summary', False):
+            refreshed = rebuild_event_daily_summary(event.get('summary_days_back', 30))
+            return {
+                'statusCode': 200,
+                'body': json.dumps({
+                    'message': 'Summary rebuilt',
+                    'summary_rows_refreshed': refreshed
+                })
+            }
+        
         logger.info(f"Starting Eventbrite data extraction for location code: {location_code}")
         
         # Scrape Eventbrite events
@@ -2,6 +2,7 @@ import os
 import sys
 import traceback
 import logging
+from datetime import datetime
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -15,19 +16,37 @@ from decouple import config
 # Import agent modules
 from agents_sse import AdvertisingAgents
 from tasks import AdvertisingTasks
+from tools.business_profiles import event_matches_keywords, keywords_for_business, rank_events
+from tools.event_records import EventSummary
 from tools.events_tool_crewai import EventsTool
+from tools.zip_index import geocode_postal_code, get_zip_index
+
+# Baselines with fewer days behind them are too noisy to call today unusual
+MIN_BASELINE_SAMPLES = 5
 
 
 class AdvertisingAdvisorCrew:
     def __init__(self, business_name, business_type, business_postal_code, 
-                business_latitude, business_longitude, business_email):
-        """Initialize the Advertising Advisor Crew with business details"""
+                business_latitude, business_longitude, business_email, prefetched_events=None,
+                prefetched_weather=None):
+        """Initialize the Advertising Advisor Crew with business details
+        
+        prefetched_events is an optional PostalCodeEvents (today's and recent
+        events, activity baselines and hourly traffic), e.g. from
+        EventsTool.fetch_events_for_postal_codes in the daily batch, used
+        instead of querying the database again.
+        prefetched_weather is an optional forecast, e.g. from the batch
+        MCPSSEWeatherTool.get_forecasts call, used instead of calling the
+        weather server again.
+        """
         self.business_name = business_name
         self.business_type = business_type
         self.business_postal_code = business_postal_code
         self.business_latitude = business_latitude
         self.business_longitude = business_longitude
         self.business_email = business_email
+        self.prefetched_events = prefetched_events
+        self.prefetched_weather = prefetched_weather
         # Get Gemini API key from environment or .env file
         self.gemini_api_key = os.environ.get("GOOGLE_API_KEY") or config("GOOGLE_API_KEY")
 
@@ -41,31 +60,45 @@ class AdvertisingAdvisorCrew:
         logger.info("Fetching event data from database...")
         
         try:
-            # Use separate EventsTool instances to avoid connection reuse issues
-            events_tool_1 = EventsTool()
-            todays_events = events_tool_1.get_todays_events(self.business_postal_code)
-            
-            # Add delay to ensure proper connection cleanup
-            import time
-            time.sleep(2)
+            # Events handed in by the daily batch, else today's shared snapshot, if any
+            prefetched_events = self.prefetched_events
+            if prefetched_events is None:
+                prefetched_events = EventsTool().fetch_snapshot_events(self.business_postal_code, 7)
             
-            # Use separate instance for second call
-            events_tool_2 = EventsTool()
-            recent_events = events_tool_2.get_events_by_postal_code(self.business_postal_code, 7)
+            if prefetched_events is not None:
+                event_summary, relevant_events, relevant_todays_events = self._summarize_prefetched_events(prefetched_events, 7)
+                # Baselines and hourly traffic (around the postal code's centroid) came with the events
+                activity_baseline = prefetched_events.activity_baseline
+                hourly_traffic = prefetched_events.hourly_traffic
+            else:
+                # Counts and top events aggregated in the database, the few events most
+                # relevant to this business, baselines and hourly traffic, all on one pool
+                event_summary, relevant_events, relevant_todays_events, activity_baseline, hourly_traffic = (
+                    EventsTool().fetch_business_events(
+                        self.business_postal_code, self.business_type,
+                        float(self.business_latitude), float(self.business_longitude), 7, 5,
+                    )
+                )
             
-            events_data = f"Today's Events:\n{todays_events}\n\nRecent Events (Past 7 Days):\n{recent_events}"
+            # Summarize events data to reduce input length
+            events_summary = self._summarize_events_data(event_summary, relevant_events, relevant_todays_events,
+                                                         activity_baseline, hourly_traffic)
             logger.info("Event data retrieved successfully.")
         except Exception as e:
             logger.warning(f"Could not fetch event data: {e}")
-            events_data = f"Unable to fetch event data for postal code {self.business_postal_code}. Please analyze based on general business insights."
+            events_summary = f"Unable to fetch event data for postal code {self.business_postal_code}. Please analyze based on general business insights."
         
         # Get weather data directly
         logger.info("Fetching weather data from MCP server...")
         try:
-            from tools.weather_tool_sse import MCPSSEWeatherTool
-            weather_tool = MCPSSEWeatherTool()
-            weather_coords = f"{self.business_latitude},{self.business_longitude}"
-            weather_data = weather_tool._run(weather_coords)
+            if self.prefetched_weather is not None:
+                # The batch forecast already includes alerts and the business-hours window
+                weather_data = self.prefetched_weather
+            else:
+                from tools.weather_tool_sse import MCPSSEWeatherTool
+                weather_tool = MCPSSEWeatherTool()
+                weather_coords = f"{self.business_latitude},{self.business_longitude}"
+                weather_data = weather_tool._run(weather_coords)
             logger.info("Weather data retrieved successfully.")
         except Exception as e:
             logger.warning(f"Could not fetch weather data: {e}")
@@ -77,9 +110,6 @@ class AdvertisingAdvisorCrew:
         marketing_strategist = agents.marketing_strategist()
         
         # Create the tasks with event data included
-        # Summarize events data to reduce input length
-        events_summary = self._summarize_events_data(events_data)
-        
         collect_events = Task(
             description=f"""
             Analyze the following event summary for postal code {self.business_postal_code}:
@@ -101,12 +131,16 @@ class AdvertisingAdvisorCrew:
             description=f"""
             Analyze weather conditions for {self.business_name} at coordinates {self.business_latitude}, {self.business_longitude}:
             
-            Weather Data: {weather_data[:300]}...
+            Weather Data (compact JSON forecast periods when available: temp, pop = chance of
+            precipitation in %, wind_mph, cond = condition code; start/end are local times;
+            the hourly forecast covers today's business hours hour by hour):
+            {weather_data}
             
             Your task is to:
             1. Analyze how weather affects {self.business_type} customer behavior
-            2. Identify opportunities or challenges from current conditions
+            2. Identify opportunities or challenges from current conditions, including any active weather alerts
             3. Provide specific weather-based recommendations
+            4. Name the hours today with the best weather for foot traffic, using the hourly forecast
             
             Keep analysis focused and concise.
             """,
@@ -138,8 +172,9 @@ class AdvertisingAdvisorCrew:
     
     Keep response concise and actionable. Don't exceed 200 words.
     Only analyze for today. The event data provided is for today and past 7 days.
-    Compare with the past events data and determine whether to advertise today or not.
+    Compare with the past events data (the "Today vs Normal" z-scores show how unusual today is) and determine whether to advertise today or not.
     Analyze the events and weather data and provide recommendations if the event members are likely to visit the business today.
+    Pick the best times from the hourly event foot traffic and the best weather hours named by the weather analyst.
     End with a friendly closing:
     <p>Hope this helps!<br>
     Best regards,<br>
@@ -189,50 +224,100 @@ class AdvertisingAdvisorCrew:
         
         return formatted_result
 
-    def _summarize_events_data(self, events_data):
-        """Summarize event data to reduce input length for LLM"""
-        lines = events_data.split('\n')
-        
-        # Extract just the key info
-        today_events = []
-        recent_events = []
-        current_section = None
-        
-        for line in lines:
-            if "Today's Events:" in line:
-                current_section = "today"
-                continue
-            elif "Recent Events" in line:
-                current_section = "recent"
-                continue
-            elif line.startswith("Event:"):
-                event_name = line.replace("Event: ", "").strip()
-                if current_section == "today":
-                    today_events.append(event_name)
-                elif current_section == "recent":
-                    recent_events.append(event_name)
+    def _summarize_prefetched_events(self, prefetched_events, days_back):
+        """Build the event summary and relevant events from prefetched records, without a database query"""
+        today = datetime.now().date()
+        todays_records, recent_records = prefetched_events.todays_events, prefetched_events.recent_events
+        event_summary = EventSummary.from_records(self.business_postal_code, days_back, today, recent_records)
+        
+        events_tool = EventsTool()
+        distances = dict(get_zip_index().within(self.business_postal_code, events_tool.neighbour_radius_km))
+        relevant_events = rank_events(recent_records, self.business_type, distances, today, 5)
+        
+        keywords = keywords_for_business(self.business_type)
+        matching_today = [event for event in todays_records if event_matches_keywords(event, keywords)]
+        relevant_todays_events = rank_events(matching_today, self.business_type, distances, today, 5)
+        return event_summary, relevant_events, relevant_todays_events
+
+    def _summarize_events_data(self, event_summary, relevant_events, relevant_todays_events,
+                               activity_baseline=(), hourly_traffic=()):
+        """Summarize aggregated event data to reduce input length for LLM"""
+        today_events = event_summary.todays_top_events
+        recent_events = event_summary.recent_top_events
+        events_by_day = ', '.join(f"{day:%a %m/%d}: {count}" for day, count in event_summary.counts_by_day)
+        event_formats = ', '.join(f"{name}: {count}" for name, count in event_summary.counts_by_format.items())
+        event_types = '\n'.join(f"- {category}: {count}" for category, count in event_summary.counts_by_category.items())
+        key_venues = ', '.join(f"{venue} ({count})" for venue, count in event_summary.counts_by_venue)
+        today_vs_normal = self._summarize_activity_baseline(activity_baseline)
+        traffic_by_hour = ', '.join(
+            f"{'time not listed' if traffic.hour < 0 else f'{traffic.hour:02d}:00'}: "
+            f"{traffic.event_count} events (~{traffic.expected_attendance} people)"
+            for traffic in hourly_traffic
+        )
+        most_relevant = '\n'.join(
+            f"- {event.name} ({event.start_date:%a %m/%d}, {event.venue_name or 'venue not specified'})"
+            for event in relevant_events
+        )
         
         # Create summary
         summary = f"""
 Event Summary for Postal Code {self.business_postal_code}:
 
-Today's Events ({len(today_events)} total):
-{', '.join(today_events[:5])}{'...' if len(today_events) > 5 else ''}
+Today's Events ({event_summary.todays_count} total):
+{', '.join(today_events)}{'...' if event_summary.todays_count > len(today_events) else ''}
+
+Today's Events Matching {self.business_type}:
+{', '.join(event.name for event in relevant_todays_events) or 'None'}
 
-Recent Events ({len(recent_events)} total in past 7 days):
-{', '.join(recent_events[:5])}{'...' if len(recent_events) > 5 else ''}
+Recent Events ({event_summary.window_count} total in past {event_summary.days_back} days):
+{', '.join(recent_events)}{'...' if event_summary.window_count > len(recent_events) else ''}
+
+Most Relevant Events for {self.business_type}:
+{most_relevant or 'None'}
+
+Today vs Normal (postal code {self.business_postal_code} alone, without its neighbours):
+{today_vs_normal or 'No baseline available yet'}
+
+Event Foot Traffic Nearby by Hour Today: {traffic_by_hour or 'No timed events found'}
+
+Events by Day: {events_by_day or 'None'}
+
+Event Formats: {event_formats or 'None'}
 
 Event Types Identified:
-- Entertainment/Gaming: Scavenger hunts, escape rooms, tours
-- Professional: AI training, leadership workshops  
-- Social: Date nights, matchmaking events
-- Food/Beverage: Sip & glaze experiences
+{event_types or 'None'}
 
-Key Venues: 300 W 13th St, Made in KC Cafe, Regus Downtown, River Bluff Brewing
+Key Venues: {key_venues or 'None'}
         """
         
         return summary.strip()
 
+    def _summarize_activity_baseline(self, activity_baseline, max_categories=3):
+        """Render today's counts against the rolling baselines, one line per comparison"""
+        labels = {'day': 'All events', 'weekday': f"All events vs other {datetime.now():%A}s"}
+        lines = []
+        categories = []
+        for comparison in activity_baseline:
+            if comparison.sample_count < MIN_BASELINE_SAMPLES:
+                continue
+            if comparison.dimension == 'category':
+                # Only the categories that are active today or usually are
+                if comparison.today or comparison.mean:
+                    categories.append(comparison)
+                continue
+            lines.append(self._format_baseline_comparison(labels[comparison.dimension], comparison))
+        
+        categories.sort(key=lambda comparison: -abs(comparison.z_score))
+        for comparison in categories[:max_categories]:
+            lines.append(self._format_baseline_comparison(comparison.key, comparison))
+        return '\n'.join(lines)
+
+    def _format_baseline_comparison(self, label, comparison):
+        return (
+            f"- {label} ({comparison.window_days}-day baseline): today {comparison.today} vs normal "
+            f"{comparison.mean:.1f} ± {comparison.stddev:.1f} (z = {comparison.z_score:+.1f})"
+        )
+
     def _extract_channels_from_result(self, result):
         """Extract recommended channels from the result text"""
         channels = []
@@ -277,7 +362,7 @@ Key Venues: 300 W 13th St, Made in KC Cafe, Regus Downtown, River Bluff Brewing
         return channels
 
 # Function to handle web requests
-def main(params, stream=False):
+def main(params, stream=False, prefetched_events=None, prefetched_weather=None):
     """Main function to process web requests"""
     try:
         # Extract parameters from the web request
@@ -296,6 +381,14 @@ def main(params, stream=False):
         business_latitude = params.get('business_latitude')
         business_longitude = params.get('business_longitude')
         
+        # Resolve missing coordinates from the postal code with the offline ZIP centroid lookup
+        if business_latitude is None or business_longitude is None:
+            centroid = geocode_postal_code(business_postal_code)
+            if centroid:
+                business_latitude, business_longitude = centroid
+            else:
+                logger.warning(f"No coordinates known for postal code {business_postal_code}, using defaults")
+        
         if business_latitude is not None:
             business_latitude = float("{:.4f}".format(float(business_latitude)))
         else:
@@ -316,7 +409,9 @@ def main(params, stream=False):
             business_postal_code,
             business_latitude,
             business_longitude,
-            business_email
+            business_email,
+            prefetched_events,
+            prefetched_weather
         )
         
         result = crew.run(stream=stream)
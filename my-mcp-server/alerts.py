@@ -0,0 +1,125 @@
+"""In-memory table of active NWS alerts, looked up by zone or by point.
+
+A background task replaces the table with the current national list of active
+alerts on an interval. Lookups never go upstream: zone lookups are a dict read,
+and point lookups test the alert polygons whose bounding box contains the point.
+"""
+import time
+from typing import Any, Iterable, NamedTuple
+
+
+class Alert(NamedTuple):
+    id: str
+    event: str
+    severity: str
+    urgency: str
+    headline: str | None
+    ends: str | None
+    zones: tuple[str, ...]
+    # Outer rings of the alert's polygons as (lon, lat) points, if it has a geometry
+    polygons: tuple[tuple[tuple[float, float], ...], ...]
+
+    @classmethod
+    def from_feature(cls, feature: dict[str, Any]) -> "Alert":
+        props = feature["properties"]
+        zones = set((props.get("geocode") or {}).get("UGC") or ())
+        zones.update(url.rstrip("/").rsplit("/", 1)[-1] for url in props.get("affectedZones") or ())
+        return cls(
+            id=props.get("id") or feature.get("id", ""),
+            event=props.get("event", "Unknown"),
+            severity=props.get("severity", "Unknown"),
+            urgency=props.get("urgency", "Unknown"),
+            headline=props.get("headline"),
+            ends=props.get("ends") or props.get("expires"),
+            zones=tuple(sorted(zones)),
+            polygons=_outer_rings(feature.get("geometry")),
+        )
+
+    def compact(self) -> dict[str, Any]:
+        """The fields a recommendation needs, for compact JSON output"""
+        return {"event": self.event, "severity": self.severity, "urgency": self.urgency,
+                "headline": self.headline, "ends": self.ends}
+
+
+def _outer_rings(geometry: dict[str, Any] | None) -> tuple:
+    if not geometry:
+        return ()
+    if geometry.get("type") == "Polygon":
+        polygons = [geometry["coordinates"]]
+    elif geometry.get("type") == "MultiPolygon":
+        polygons = geometry["coordinates"]
+    else:
+        return ()
+    return tuple(tuple((float(lon), float(lat)) for lon, lat, *_ in polygon[0]) for polygon in polygons if polygon)
+
+
+def point_in_ring(longitude: float, latitude: float, ring: tuple[tuple[float, float], ...]) -> bool:
+    """Ray casting test of a point against a polygon ring"""
+    inside = False
+    previous_lon, previous_lat = ring[-1]
+    for lon, lat in ring:
+        if (lat > latitude) != (previous_lat > latitude):
+            crossing = lon + (latitude - lat) * (previous_lon - lon) / (previous_lat - lat)
+            if longitude < crossing:
+                inside = not inside
+        previous_lon, previous_lat = lon, lat
+    return inside
+
+
+class AlertsTable:
+    """Active alerts indexed by zone, plus the polygon alerts with their bounding boxes."""
+
+    def __init__(self):
+        self._by_zone: dict[str, list[Alert]] = {}
+        self._polygons: list[tuple[tuple[float, float, float, float], tuple, Alert]] = []
+        self.count = 0
+        self.refreshed_at: float | None = None
+        self.refreshes = 0
+        self.failed_refreshes = 0
+
+    def replace(self, features: Iterable[dict[str, Any]]):
+        """Swap in a new set of active alerts"""
+        by_zone: dict[str, list[Alert]] = {}
+        polygons = []
+        count = 0
+        for feature in features:
+            alert = Alert.from_feature(feature)
+            count += 1
+            for zone in alert.zones:
+                by_zone.setdefault(zone, []).append(alert)
+            for ring in alert.polygons:
+                lons = [lon for lon, _ in ring]
+                lats = [lat for _, lat in ring]
+                polygons.append(((min(lons), min(lats), max(lons), max(lats)), ring, alert))
+
+        # Readers see either the old or the new table, never a mix
+        self._by_zone, self._polygons = by_zone, polygons
+        self.count = count
+        self.refreshed_at = time.time()
+        self.refreshes += 1
+
+    def for_zones(self, zones: Iterable[str | None]) -> list[Alert]:
+        alerts = {}
+        for zone in zones:
+            for alert in self._by_zone.get(zone or "", ()):
+                alerts[alert.id] = alert
+        return list(alerts.values())
+
+    def for_point(self, latitude: float, longitude: float, zones: Iterable[str | None] = ()) -> list[Alert]:
+        """Alerts whose polygon contains the point, plus those issued for any of its zones"""
+        alerts = {alert.id: alert for alert in self.for_zones(zones)}
+        for (min_lon, min_lat, max_lon, max_lat), ring, alert in self._polygons:
+            if (alert.id not in alerts and min_lon <= longitude <= max_lon and min_lat <= latitude <= max_lat
+                    and point_in_ring(longitude, latitude, ring)):
+                alerts[alert.id] = alert
+        return list(alerts.values())
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "alerts": self.count,
+            "zones": len(self._by_zone),
+            "polygons": len(self._polygons),
+            "age_seconds": round(time.time() - self.refreshed_at, 1) if self.refreshed_at else None,
+            "refreshes": self.refreshes,
+            "failed_refreshes": self.failed_refreshes,
+        }
@@ -0,0 +1,114 @@
+"""Compact, structured forecast periods.
+
+Turns NWS forecast periods into small dicts with numeric fields and a short
+condition code, e.g.
+
+    {"name": "Tonight", "start": "2026-10-19T18:00:00-05:00", "end": "...",
+     "day": false, "temp": 54, "unit": "F", "pop": 20, "wind_mph": 10,
+     "wind_dir": "S", "cond": "partly_cloudy"}
+
+Clients can slice the list by start/end time instead of truncating prose.
+Hourly forecasts are sliced to a local time window on the server instead, as
+the full series runs to about 156 hours.
+"""
+import re
+from datetime import date, datetime
+from typing import Any
+
+# Checked in order; the first condition with a phrase in the NWS short
+# forecast wins, so the more impactful conditions come first. Phrases match
+# whole words (plural allowed), and the "partly"/"mostly" phrases are checked
+# before the bare words they contain.
+CONDITION_CODES = [
+    ("tstorm", ("thunderstorm", "t-storm", "tstorm")),
+    ("snow", ("snow", "blizzard", "flurries")),
+    ("ice", ("sleet", "freezing", "ice")),
+    ("rain", ("rain", "showers", "drizzle")),
+    ("fog", ("fog", "haze", "smoke")),
+    ("wind", ("windy", "breezy", "blustery")),
+    ("partly_cloudy", ("partly cloudy", "partly sunny", "mostly sunny", "mostly clear")),
+    ("cloudy", ("mostly cloudy", "cloudy", "overcast")),
+    ("clear", ("sunny", "clear", "fair")),
+]
+
+_CONDITION_PATTERNS = [
+    (code, re.compile(r"\b(?:" + "|".join(re.escape(word).replace(r"\ ", r"\s+") for word in words) + r")s?\b"))
+    for code, words in CONDITION_CODES
+]
+
+
+def condition_code(short_forecast: str | None) -> str:
+    """Map an NWS short forecast ("Chance Showers And Thunderstorms") to a condition code
+
+    >>> [condition_code(text) for text in ("Partly Cloudy", "Mostly Cloudy", "Cloudy", "Partly Sunny")]
+    ['partly_cloudy', 'cloudy', 'cloudy', 'partly_cloudy']
+    >>> [condition_code(text) for text in ("Mostly Sunny", "Sunny", "Mostly Clear", "Clear")]
+    ['partly_cloudy', 'clear', 'partly_cloudy', 'clear']
+    >>> [condition_code(text) for text in ("Chance T-storms", "Slight Chance Rain Showers", "Patchy Fog", None)]
+    ['tstorm', 'rain', 'fog', 'other']
+    """
+    text = (short_forecast or "").lower()
+    for code, pattern in _CONDITION_PATTERNS:
+        if pattern.search(text):
+            return code
+    return "other"
+
+
+def wind_mph(wind_speed: str | None) -> int | None:
+    """Highest speed in an NWS wind string such as "5 to 10 mph" """
+    speeds = [int(speed) for speed in re.findall(r"\d+", wind_speed or "")]
+    return max(speeds) if speeds else None
+
+
+def compact_period(period: dict[str, Any]) -> dict[str, Any]:
+    """Structured, compact form of one NWS forecast period"""
+    precipitation = (period.get("probabilityOfPrecipitation") or {}).get("value")
+    return {
+        "name": period.get("name") or None,
+        "start": period["startTime"],
+        "end": period["endTime"],
+        "day": period.get("isDaytime"),
+        "temp": period.get("temperature"),
+        "unit": period.get("temperatureUnit"),
+        "pop": precipitation if precipitation is not None else 0,
+        "wind_mph": wind_mph(period.get("windSpeed")),
+        "wind_dir": period.get("windDirection"),
+        "cond": condition_code(period.get("shortForecast")),
+    }
+
+
+def compact_forecast(forecast_data: dict[str, Any], gridpoint_key: str) -> dict[str, Any]:
+    """Structured form of a whole forecast response"""
+    properties = forecast_data["properties"]
+    return {
+        "gridpoint": gridpoint_key,
+        "updated": properties.get("updateTime") or properties.get("updated"),
+        "periods": [compact_period(period) for period in properties["periods"]],
+    }
+
+
+def hourly_window(forecast_data: dict[str, Any], start_hour: int, end_hour: int,
+                  day: date | None = None) -> tuple[date | None, list[dict[str, Any]]]:
+    """Compact hourly periods starting from `start_hour` up to (not including) `end_hour` on `day`.
+
+    Hours are local to the forecast location, as given by the period start
+    times; `day` defaults to the location's current date. Returns the day and
+    its periods.
+    """
+    periods = forecast_data["properties"]["periods"]
+    if not periods:
+        return day, []
+    if day is None:
+        day = datetime.now(datetime.fromisoformat(periods[0]["startTime"]).tzinfo).date()
+
+    window = []
+    for period in periods:
+        start = datetime.fromisoformat(period["startTime"])
+        if start.date() == day and start_hour <= start.hour < end_hour:
+            compact = compact_period(period)
+            if compact["name"] is None:
+                del compact["name"]  # Hourly periods are unnamed
+            window.append(compact)
+        elif start.date() > day:
+            break
+    return day, window
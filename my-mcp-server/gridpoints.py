@@ -0,0 +1,143 @@
+"""Persistent cache of NWS `/points` lookups.
+
+The `/points/{lat},{lon}` endpoint only maps a location to its forecast
+office and grid square, which practically never changes. Caching that mapping
+lets a forecast cost one upstream request instead of two sequential ones.
+
+Entries are kept in memory and written to SQLite in batches by `flush`, so
+the cache survives restarts and redeploys that keep the database file. The
+file lives in the container's filesystem unless its path is on a mounted
+volume; App Runner does not persist that between deployments.
+"""
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, NamedTuple
+
+
+class Gridpoint(NamedTuple):
+    """The NWS grid square serving a location."""
+    grid_id: str                # Forecast office, e.g. "EAX"
+    grid_x: int
+    grid_y: int
+    forecast_url: str
+    forecast_hourly_url: str
+    forecast_zone: str | None   # Zone id, e.g. "KSZ104"
+    county: str | None          # County zone id, e.g. "KSC091"
+    time_zone: str | None
+
+    @classmethod
+    def from_points(cls, points_data: dict[str, Any]) -> "Gridpoint":
+        """Build a gridpoint from a `/points` response"""
+        props = points_data["properties"]
+        return cls(
+            grid_id=props["gridId"],
+            grid_x=props["gridX"],
+            grid_y=props["gridY"],
+            forecast_url=props["forecast"],
+            forecast_hourly_url=props["forecastHourly"],
+            forecast_zone=_zone_id(props.get("forecastZone")),
+            county=_zone_id(props.get("county")),
+            time_zone=props.get("timeZone"),
+        )
+
+    @property
+    def key(self) -> str:
+        """Identifies the grid square; locations in the same square share forecasts"""
+        return f"{self.grid_id}/{self.grid_x},{self.grid_y}"
+
+
+def _zone_id(zone_url: str | None) -> str | None:
+    # Zones are given as URLs, e.g. https://api.weather.gov/zones/forecast/KSZ104
+    return zone_url.rstrip("/").rsplit("/", 1)[-1] if zone_url else None
+
+
+class GridpointCache:
+    """Rounded coordinates -> Gridpoint, in memory and in SQLite."""
+
+    def __init__(self, path: str, decimals: int = 3, ttl_seconds: float = 30 * 24 * 3600):
+        self.decimals = decimals
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: dict[tuple[float, float], tuple[Gridpoint, float]] = {}
+        # Entries put since the last flush; the database has its own lock so
+        # lookups never wait on a write
+        self._pending: dict[tuple[float, float], tuple[Gridpoint, float]] = {}
+        self._db_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS gridpoints (
+                latitude REAL NOT NULL,
+                longitude REAL NOT NULL,
+                gridpoint TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (latitude, longitude)
+            )
+        """)
+        self._db.commit()
+
+        # Load everything up front; there is one small row per known location
+        cutoff = time.time() - ttl_seconds
+        for latitude, longitude, gridpoint, fetched_at in self._db.execute(
+                "SELECT latitude, longitude, gridpoint, fetched_at FROM gridpoints WHERE fetched_at >= ?", (cutoff,)):
+            self._entries[(latitude, longitude)] = (Gridpoint(*json.loads(gridpoint)), fetched_at)
+
+    def key_for(self, latitude: float, longitude: float) -> tuple[float, float]:
+        """Round coordinates so nearby lookups of the same place share an entry"""
+        return round(latitude, self.decimals), round(longitude, self.decimals)
+
+    def get(self, latitude: float, longitude: float) -> Gridpoint | None:
+        key = self.key_for(latitude, longitude)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[1] < self.ttl_seconds:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            return None
+
+    def put(self, latitude: float, longitude: float, gridpoint: Gridpoint):
+        """Cache a gridpoint in memory; it reaches SQLite on the next `flush`"""
+        key = self.key_for(latitude, longitude)
+        entry = (gridpoint, time.time())
+        with self._lock:
+            self._entries[key] = entry
+            self._pending[key] = entry
+
+    def flush(self) -> int:
+        """Write the pending entries to SQLite in one transaction and return how many.
+
+        Blocks on disk I/O, so async callers run it in a worker thread.
+        """
+        with self._db_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            self._db.executemany(
+                "INSERT OR REPLACE INTO gridpoints (latitude, longitude, gridpoint, fetched_at) VALUES (?, ?, ?, ?)",
+                [(key[0], key[1], json.dumps(list(gridpoint)), fetched_at)
+                 for key, (gridpoint, fetched_at) in pending.items()],
+            )
+            self._db.commit()
+            return len(pending)
+
+    def __contains__(self, coordinates: tuple[float, float]) -> bool:
+        key = self.key_for(*coordinates)
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and time.time() - entry[1] < self.ttl_seconds
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            }
@@ -0,0 +1,128 @@
+"""Response cache for NWS forecasts and alerts that follows HTTP caching rules.
+
+Entries are keyed by URL. Forecast URLs name a grid square and alert URLs name
+an area or point, so every business in the same grid square shares one entry.
+
+Freshness comes from the upstream `Cache-Control: max-age` (or `Expires`)
+headers. Once an entry is stale, it is revalidated with `If-None-Match` /
+`If-Modified-Since`, and a 304 reply only extends its lifetime.
+"""
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import Any, NamedTuple
+
+
+class CachedResponse(NamedTuple):
+    data: Any
+    etag: str | None
+    last_modified: str | None
+    expires_at: float        # time.time() after which the entry must be revalidated
+    stored_at: float
+
+
+def freshness_lifetime(headers, default_ttl: float) -> float | None:
+    """Seconds a response may be served without revalidation; None if it must not be stored"""
+    cache_control = {}
+    for directive in headers.get("cache-control", "").split(","):
+        name, _, value = directive.strip().partition("=")
+        if name:
+            cache_control[name.lower()] = value.strip('"')
+
+    if "no-store" in cache_control:
+        return None
+    if "no-cache" in cache_control:
+        return 0.0
+    for directive in ("s-maxage", "max-age"):
+        if cache_control.get(directive, "").isdigit():
+            return float(cache_control[directive])
+
+    expires = headers.get("expires")
+    if expires:
+        try:
+            date = parsedate_to_datetime(headers["date"]) if headers.get("date") else None
+            lifetime = parsedate_to_datetime(expires).timestamp() - (date.timestamp() if date else time.time())
+            return max(lifetime, 0.0)
+        except (TypeError, ValueError):
+            return 0.0  # An invalid Expires means already expired
+    return default_ttl
+
+
+class HttpCache:
+    """LRU of parsed JSON responses with their validators and expiry."""
+
+    def __init__(self, max_entries: int = 2048, default_ttl: float = 60.0, max_stale: float = 3600.0):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        # How long past expiry an entry may still be served when revalidation fails
+        self.max_stale = max_stale
+        self._entries: OrderedDict[str, CachedResponse] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.not_modified = 0
+        self.stale_served = 0
+
+    def get(self, url: str) -> CachedResponse | None:
+        """Return the entry for a URL, fresh or stale"""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                self._entries.move_to_end(url)
+            return entry
+
+    def is_fresh(self, entry: CachedResponse) -> bool:
+        return time.time() < entry.expires_at
+
+    def can_serve_stale(self, entry: CachedResponse) -> bool:
+        return time.time() < entry.expires_at + self.max_stale
+
+    def conditional_headers(self, entry: CachedResponse | None) -> dict[str, str]:
+        """Validators to send when revalidating an entry"""
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def store(self, url: str, data: Any, headers) -> None:
+        """Store a 200 response, unless its headers forbid it"""
+        lifetime = freshness_lifetime(headers, self.default_ttl)
+        if lifetime is None:
+            return
+        now = time.time()
+        entry = CachedResponse(data, headers.get("etag"), headers.get("last-modified"), now + lifetime, now)
+        with self._lock:
+            self._entries[url] = entry
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def refresh(self, url: str, entry: CachedResponse, headers) -> CachedResponse:
+        """Extend an entry's lifetime after a 304 Not Modified"""
+        lifetime = freshness_lifetime(headers, self.default_ttl) or 0.0
+        entry = entry._replace(
+            etag=headers.get("etag") or entry.etag,
+            expires_at=time.time() + lifetime,
+        )
+        with self._lock:
+            self._entries[url] = entry
+            self.not_modified += 1
+        return entry
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "revalidations": self.revalidations,
+                "not_modified": self.not_modified,
+                "stale_served": self.stale_served,
+            }
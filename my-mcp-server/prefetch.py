@@ -0,0 +1,60 @@
+"""Bookkeeping for forecast prefetches.
+
+A scheduler calls the `prefetch_forecasts` tool with every subscriber location
+shortly before the daily run. The last run is remembered here so coverage
+(how many of its grid squares still have a fresh forecast and hourly forecast
+cached) and staleness (how old those forecasts are) can be reported afterwards.
+"""
+import time
+from typing import Any
+
+from http_cache import HttpCache
+
+
+class PrefetchRun:
+    """One prefetch of forecasts for a set of locations."""
+
+    def __init__(self, locations: int, forecast_urls: dict[str, str], failed: list[str],
+                 hourly_urls: dict[str, str], failed_hourly: list[str], unresolved: int, duration_ms: float):
+        self.finished_at = time.time()
+        self.locations = locations
+        self.forecast_urls = forecast_urls  # Gridpoint key -> forecast URL
+        self.failed = failed                # Gridpoint keys whose forecast could not be fetched
+        self.hourly_urls = hourly_urls      # Gridpoint key -> hourly forecast URL
+        self.failed_hourly = failed_hourly  # Gridpoint keys whose hourly forecast could not be fetched
+        self.unresolved = unresolved        # Locations without a grid square
+        self.duration_ms = duration_ms
+
+    def report(self, http_cache: HttpCache) -> dict[str, Any]:
+        """Coverage and staleness of the prefetched forecasts and hourly forecasts as of now"""
+        now = time.time()
+        cached, fresh = _cached_and_fresh(http_cache, self.forecast_urls.values())
+        hourly_cached, hourly_fresh = _cached_and_fresh(http_cache, self.hourly_urls.values())
+        grid_squares = len(self.forecast_urls)
+        return {
+            "finished_at": self.finished_at,
+            "age_seconds": round(now - self.finished_at, 1),
+            "duration_ms": round(self.duration_ms),
+            "locations": self.locations,
+            "unresolved_locations": self.unresolved,
+            "grid_squares": grid_squares,
+            "failed": len(self.failed),
+            "cached": len(cached),
+            "fresh": len(fresh),
+            "coverage": round(len(fresh) / grid_squares, 4) if grid_squares else None,
+            "hourly_failed": len(self.failed_hourly),
+            "hourly_cached": len(hourly_cached),
+            "hourly_fresh": len(hourly_fresh),
+            "hourly_coverage": round(len(hourly_fresh) / len(self.hourly_urls), 4) if self.hourly_urls else None,
+            # Age of the oldest cached forecast of either kind, and how soon the first fresh one expires
+            "max_forecast_age_seconds": (round(max(now - entry.stored_at for entry in cached + hourly_cached), 1)
+                                         if cached or hourly_cached else None),
+            "min_seconds_until_stale": (round(min(entry.expires_at - now for entry in fresh + hourly_fresh), 1)
+                                        if fresh or hourly_fresh else None),
+        }
+
+
+def _cached_and_fresh(http_cache: HttpCache, urls) -> tuple[list, list]:
+    """The cache entries of the given URLs, and those of them that are still fresh"""
+    cached = [entry for entry in map(http_cache.get, urls) if entry is not None]
+    return cached, [entry for entry in cached if http_cache.is_fresh(entry)]
@@ -1,14 +1,31 @@
-from typing import Any
+from typing import Any, Awaitable, Callable, Iterable, TypeVar
+import asyncio
+import contextlib
+import datetime
+import json
+import logging
+import os
+import time
 import httpx
 from mcp.server.fastmcp import FastMCP      # Main MCP server class
 from starlette.applications import Starlette  # ASGI framework
 from mcp.server.sse import SseServerTransport  # SSE transport implementation
 from starlette.requests import Request
-from starlette.responses import HTMLResponse
+from starlette.responses import HTMLResponse, JSONResponse
 from starlette.routing import Mount, Route
 from mcp.server import Server              # Base server class
 import uvicorn                             # ASGI server
 
+from alerts import AlertsTable
+from forecasts import compact_forecast, hourly_window
+from gridpoints import Gridpoint, GridpointCache
+from http_cache import HttpCache
+from prefetch import PrefetchRun
+from singleflight import SingleFlight
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("weather")
+
 # Initialize FastMCP server with a name
 # This name appears to clients when they connect
 mcp = FastMCP("weather")
@@ -17,23 +34,243 @@ mcp = FastMCP("weather")
 NWS_API_BASE = "https://api.weather.gov"
 USER_AGENT = "weather-app/1.0"      # Required by NWS API
 
+# One keep-alive client for the server's lifetime, so NWS calls reuse pooled
+# connections instead of paying DNS, TCP and TLS setup each time
+NWS_HTTP2 = os.environ.get("NWS_HTTP2", "true").lower() == "true"
+NWS_TIMEOUT = httpx.Timeout(
+    float(os.environ.get("NWS_READ_TIMEOUT_SECONDS", "15")),
+    connect=float(os.environ.get("NWS_CONNECT_TIMEOUT_SECONDS", "5")),
+)
+NWS_LIMITS = httpx.Limits(
+    max_connections=int(os.environ.get("NWS_MAX_CONNECTIONS", "20")),
+    max_keepalive_connections=int(os.environ.get("NWS_MAX_CONNECTIONS", "20")),
+    keepalive_expiry=60.0,
+)
+http_client: httpx.AsyncClient | None = None
+
+# Location -> NWS grid square, persisted so restarts keep it. The default path is
+# inside the container, which App Runner discards on every deployment; point
+# GRIDPOINT_CACHE_PATH at a mounted volume to keep the cache across deployments
+gridpoint_cache = GridpointCache(
+    os.environ.get("GRIDPOINT_CACHE_PATH", "gridpoints.sqlite3"),
+    decimals=int(os.environ.get("GRIDPOINT_COORD_DECIMALS", "3")),
+)
+# Forecast and alert responses, kept as long as NWS's caching headers allow
+http_cache = HttpCache(
+    max_entries=int(os.environ.get("HTTP_CACHE_MAX_ENTRIES", "2048")),
+    default_ttl=float(os.environ.get("HTTP_CACHE_DEFAULT_TTL_SECONDS", "60")),
+    max_stale=float(os.environ.get("HTTP_CACHE_MAX_STALE_SECONDS", "3600")),
+)
+# Active alerts for the whole country, refreshed in the background
+alerts_table = AlertsTable()
+ALERTS_REFRESH_SECONDS = float(os.environ.get("ALERTS_REFRESH_SECONDS", "120"))
+
+# Upstream requests in flight, shared by concurrent callers asking for the same thing
+in_flight = SingleFlight()
+
+# The last `prefetch_forecasts` run, for coverage and staleness reporting
+last_prefetch: PrefetchRun | None = None
+
+# Concurrent upstream requests made by one batch tool call
+NWS_CONCURRENCY = int(os.environ.get("NWS_CONCURRENCY", "8"))
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+async def gather_limited(function: Callable[[T], Awaitable[R]], items: Iterable[T],
+                         limit: int = NWS_CONCURRENCY) -> list[R]:
+    """Run `function` over `items` concurrently, at most `limit` at a time, keeping input order"""
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(item: T) -> R:
+        async with semaphore:
+            return await function(item)
+
+    return await asyncio.gather(*(run(item) for item in items))
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Create the shared NWS client: pooled keep-alive connections, compressed responses, HTTP/2 if available."""
+    http2 = NWS_HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401  (httpx needs it for HTTP/2)
+        except ImportError:
+            logger.warning("NWS_HTTP2 is set but the h2 package is not installed; using HTTP/1.1")
+            http2 = False
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=NWS_TIMEOUT,
+        limits=NWS_LIMITS,
+        headers={
+            "User-Agent": USER_AGENT,      # NWS requires a user agent
+            "Accept": "application/geo+json",  # Request GeoJSON format
+            "Accept-Encoding": "gzip, deflate",
+        },
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it if used outside the app's lifespan (e.g. in scripts)"""
+    global http_client
+    if http_client is None or http_client.is_closed:
+        http_client = create_http_client()
+    return http_client
+
+
+async def fetch_nws_response(url: str, extra_headers: dict[str, str] | None = None) -> httpx.Response | None:
+    """GET an NWS URL, returning the response (200 or 304) or None on any error."""
+    started = time.perf_counter()
+    try:
+        response = await get_http_client().get(url, headers=extra_headers)
+        logger.info(f"NWS GET {url} -> {response.status_code} in {(time.perf_counter() - started) * 1000:.0f} ms ({response.http_version})")
+        if response.status_code != 304:
+            response.raise_for_status()
+        return response
+    except Exception as e:
+        logger.warning(f"NWS GET {url} failed after {(time.perf_counter() - started) * 1000:.0f} ms: {e}")
+        return None  # Return None on any error
+
 
 async def make_nws_request(url: str) -> dict[str, Any] | None:
     """Make a request to the NWS API with proper error handling.
     
     This helper function centralizes API communication logic and error handling.
     """
-    headers = {
-        "User-Agent": USER_AGENT,      # NWS requires a user agent
-        "Accept": "application/geo+json"  # Request GeoJSON format
-    }
-    async with httpx.AsyncClient() as client:
+    response = await fetch_nws_response(url)
+    if response is None:
+        return None
+    try:
+        return response.json()
+    except ValueError:
+        return None
+
+
+async def make_cached_nws_request(url: str) -> dict[str, Any] | None:
+    """Make an NWS request through the HTTP cache.
+
+    Fresh entries are served without a request. Stale ones are revalidated
+    with their ETag / Last-Modified, and served as-is for a while if NWS
+    cannot be reached. Concurrent misses for a URL share one request.
+    """
+    entry = http_cache.get(url)
+    if entry is not None and http_cache.is_fresh(entry):
+        http_cache.hits += 1
+        return entry.data
+
+    http_cache.misses += 1
+    # Concurrent misses for the same URL share one upstream request
+    return await in_flight.do(("GET", url), lambda: fetch_into_cache(url))
+
+
+async def fetch_into_cache(url: str) -> dict[str, Any] | None:
+    """Fetch or revalidate an NWS URL and store the response in the HTTP cache."""
+    entry = http_cache.get(url)
+    if entry is not None:
+        http_cache.revalidations += 1
+    response = await fetch_nws_response(url, http_cache.conditional_headers(entry))
+
+    if response is None:
+        if entry is not None and http_cache.can_serve_stale(entry):
+            http_cache.stale_served += 1
+            return entry.data
+        return None
+    if response.status_code == 304 and entry is not None:
+        return http_cache.refresh(url, entry, response.headers).data
+
+    try:
+        data = response.json()
+    except ValueError:
+        return None
+    http_cache.store(url, data, response.headers)
+    return data
+
+
+async def resolve_gridpoint(latitude: float, longitude: float) -> Gridpoint | None:
+    """Return the NWS grid square of a location, asking `/points` only on a cache miss."""
+    gridpoint = gridpoint_cache.get(latitude, longitude)
+    if gridpoint is not None:
+        return gridpoint
+
+    # Concurrent misses for the same rounded location share one `/points` request
+    latitude, longitude = gridpoint_cache.key_for(latitude, longitude)
+    return await in_flight.do(("points", latitude, longitude), lambda: fetch_gridpoint(latitude, longitude))
+
+
+async def fetch_gridpoint(latitude: float, longitude: float) -> Gridpoint | None:
+    """Look a rounded location up with `/points` and cache its grid square."""
+    points_data = await make_nws_request(f"{NWS_API_BASE}/points/{latitude},{longitude}")
+    if not points_data:
+        return None
+
+    try:
+        gridpoint = Gridpoint.from_points(points_data)
+    except (KeyError, TypeError):
+        return None  # Not a forecastable location (e.g. offshore)
+    gridpoint_cache.put(latitude, longitude, gridpoint)
+    # Keep the SQLite write off the event loop; concurrent lookups (e.g. a
+    # prefetch) share one transaction
+    await asyncio.to_thread(gridpoint_cache.flush)
+    return gridpoint
+
+
+async def refresh_alerts() -> bool:
+    """Replace the alerts table with the currently active alerts.
+
+    Every refresh asks NWS, revalidating the cached list when there is one.
+    The stale-if-error fallback of `make_cached_nws_request` is not used: if
+    NWS cannot be reached, the table keeps its alerts and its refresh time,
+    so its age shows how old the alerts really are.
+    """
+    url = f"{NWS_API_BASE}/alerts/active?status=actual"
+    entry = http_cache.get(url)
+    if entry is not None:
+        http_cache.revalidations += 1
+    response = await fetch_nws_response(url, http_cache.conditional_headers(entry))
+
+    data = None
+    if response is not None and response.status_code == 304 and entry is not None:
+        # NWS confirmed the cached list is still current
+        data = http_cache.refresh(url, entry, response.headers).data
+    elif response is not None and response.status_code != 304:
         try:
-            response = await client.get(url, headers=headers, timeout=30.0)
-            response.raise_for_status()
-            return response.json()
-        except Exception:
-            return None  # Return None on any error
+            data = response.json()
+        except ValueError:
+            data = None
+        if data:
+            http_cache.store(url, data, response.headers)
+
+    if not data or "features" not in data:
+        alerts_table.failed_refreshes += 1
+        return False
+    alerts_table.replace(data["features"])
+    return True
+
+
+async def refresh_alerts_periodically():
+    """Background task keeping the alerts table current"""
+    while True:
+        try:
+            if await refresh_alerts():
+                logger.info(f"Refreshed alerts table: {alerts_table.count} active alerts")
+            else:
+                logger.warning("Could not refresh the alerts table, keeping the previous alerts")
+        except Exception as e:
+            alerts_table.failed_refreshes += 1
+            logger.warning(f"Alerts refresh failed: {e}")
+        await asyncio.sleep(ALERTS_REFRESH_SECONDS)
+
+
+async def local_alerts(latitude: float, longitude: float) -> list[dict[str, Any]]:
+    """Active alerts for a point, from the in-memory table.
+
+    The point's forecast and county zones come from the gridpoint cache, which
+    asks NWS `/points` once on a miss.
+    """
+    gridpoint = await resolve_gridpoint(latitude, longitude)
+    zones = (gridpoint.forecast_zone, gridpoint.county) if gridpoint else ()
+    return [alert.compact() for alert in alerts_table.for_point(latitude, longitude, zones)]
 
 
 def format_alert(feature: dict) -> str:
@@ -61,7 +298,7 @@ async def get_alerts(state: str) -> str:
         state: Two-letter US state code (e.g. CA, NY)
     """
     url = f"{NWS_API_BASE}/alerts/active/area/{state}"
-    data = await make_nws_request(url)
+    data = await make_cached_nws_request(url)
 
     if not data or "features" not in data:
         return "Unable to fetch alerts or no alerts found."
@@ -73,30 +310,103 @@ async def get_alerts(state: str) -> str:
     return "\n---\n".join(alerts)
 
 
+@mcp.tool()
+async def get_point_alerts(latitude: float, longitude: float) -> str:
+    """Get the active weather alerts covering a location.
+
+    Served from an in-memory alerts table that is refreshed in the background.
+    The only upstream request is the `/points` lookup of the location's zones
+    when its grid square is not cached yet. Returns a compact JSON list of
+    {"event", "severity", "urgency", "headline", "ends"} objects ([] if none).
+
+    Args:
+        latitude: Latitude of the location
+        longitude: Longitude of the location
+    """
+    return json.dumps(await local_alerts(latitude, longitude), separators=(",", ":"))
+
+
+@mcp.tool()
+async def get_zone_alerts(zone: str) -> str:
+    """Get the active weather alerts for an NWS forecast or county zone.
+
+    Served from the in-memory alerts table. Returns a compact JSON list as
+    get_point_alerts does.
+
+    Args:
+        zone: NWS zone id (e.g. KSZ104 or KSC091)
+    """
+    alerts = alerts_table.for_zones([zone.strip().upper()])
+    return json.dumps([alert.compact() for alert in alerts], separators=(",", ":"))
+
+
 # Define another tool
 @mcp.tool()
-async def get_forecast(latitude: float, longitude: float) -> str:
+async def get_forecast(latitude: float, longitude: float, format: str = "text") -> str:
     """Get weather forecast for a location.
 
     Args:
         latitude: Latitude of the location
         longitude: Longitude of the location
+        format: "text" for readable prose of the next five periods, or "json"
+            for compact structured periods (numeric temperature, precipitation
+            probability and wind, plus a condition code) covering the whole forecast
     """
-    # First get the forecast grid endpoint
-    points_url = f"{NWS_API_BASE}/points/{latitude},{longitude}"
-    points_data = await make_nws_request(points_url)
+    # The forecast grid endpoint comes from the gridpoint cache when the location is known
+    gridpoint = await resolve_gridpoint(latitude, longitude)
 
-    if not points_data:
+    if not gridpoint:
         return "Unable to fetch forecast data for this location."
 
-    # Get the forecast URL from the points response
-    forecast_url = points_data["properties"]["forecast"]
-    forecast_data = await make_nws_request(forecast_url)
+    forecast_data = await make_cached_nws_request(gridpoint.forecast_url)
 
     if not forecast_data:
         return "Unable to fetch detailed forecast."
 
-    # Format the periods into a readable forecast
+    if format == "json":
+        return json.dumps(compact_forecast(forecast_data, gridpoint.key), separators=(",", ":"))
+    return format_forecast(forecast_data)
+
+
+@mcp.tool()
+async def get_hourly_forecast(latitude: float, longitude: float, start_hour: int = 10, end_hour: int = 20,
+                              date: str | None = None) -> str:
+    """Get the hourly forecast for a window of local hours, e.g. 10:00-20:00 today.
+
+    Returns JSON {"gridpoint", "date", "periods"} with one compact period (as in
+    get_forecast's "json" format) per hour starting in the window.
+
+    Args:
+        latitude: Latitude of the location
+        longitude: Longitude of the location
+        start_hour: First local hour of the window, 0-23
+        end_hour: Local hour the window ends at (exclusive), 1-24
+        date: Local date as YYYY-MM-DD; defaults to today at the location
+    """
+    if not 0 <= start_hour < end_hour <= 24:
+        return "Invalid window: need 0 <= start_hour < end_hour <= 24."
+    try:
+        day = datetime.date.fromisoformat(date) if date else None
+    except ValueError:
+        return "Invalid date: use YYYY-MM-DD."
+
+    gridpoint = await resolve_gridpoint(latitude, longitude)
+
+    if not gridpoint:
+        return "Unable to fetch forecast data for this location."
+
+    forecast_data = await make_cached_nws_request(gridpoint.forecast_hourly_url)
+
+    if not forecast_data:
+        return "Unable to fetch hourly forecast."
+
+    day, periods = hourly_window(forecast_data, start_hour, end_hour, day)
+    return json.dumps({"gridpoint": gridpoint.key, "date": day.isoformat() if day else None, "periods": periods},
+                      separators=(",", ":"))
+
+
+def format_forecast(forecast_data: dict) -> str:
+    """Format the next five periods of a forecast into readable text."""
     periods = forecast_data["properties"]["periods"]
     forecasts = []
     for period in periods[:5]:  # Only show next 5 periods
@@ -110,6 +420,149 @@ Forecast: {period['detailedForecast']}
 
     return "\n---\n".join(forecasts)
 
+
+async def fetch_forecasts(coordinates: list[tuple[float, float]], hourly: bool = False
+                          ) -> tuple[list[Gridpoint | None], dict[str, dict[str, Any] | None],
+                                     dict[str, dict[str, Any] | None]]:
+    """Resolve each location's grid square, then fetch one forecast per distinct grid square.
+
+    With `hourly`, each grid square's hourly forecast is fetched alongside its
+    forecast. Returns the gridpoints in input order, the forecasts by gridpoint
+    key and the hourly forecasts by gridpoint key (empty without `hourly`).
+    """
+    # Location -> grid square once per rounded location
+    points = list(dict.fromkeys(gridpoint_cache.key_for(*point) for point in coordinates))
+    gridpoint_by_point = dict(zip(points, await gather_limited(lambda point: resolve_gridpoint(*point), points)))
+    gridpoints = [gridpoint_by_point[gridpoint_cache.key_for(*point)] for point in coordinates]
+    unique = {gridpoint.key: gridpoint for gridpoint in gridpoints if gridpoint}
+    urls = [gridpoint.forecast_url for gridpoint in unique.values()]
+    if hourly:
+        urls += [gridpoint.forecast_hourly_url for gridpoint in unique.values()]
+    responses = await gather_limited(make_cached_nws_request, urls)
+    return gridpoints, dict(zip(unique, responses[:len(unique)])), dict(zip(unique, responses[len(unique):]))
+
+
+@mcp.tool()
+async def get_forecasts(locations: list[dict[str, float]], format: str = "text",
+                        start_hour: int | None = None, end_hour: int | None = None) -> str:
+    """Get weather forecasts for many locations at once.
+
+    Locations in the same NWS grid square share one upstream forecast request.
+    Returns a JSON list with one {"latitude", "longitude", "gridpoint",
+    "forecast", "alerts"} object (or "error" instead of "forecast") per
+    location, in input order. Alerts come from the in-memory alerts table.
+    With start_hour and end_hour, each object also has "hourly": {"date",
+    "periods"} as in get_hourly_forecast for today's window (null if the
+    hourly forecast could not be fetched).
+
+    Args:
+        locations: List of {"latitude": ..., "longitude": ...} objects
+        format: "text" for readable forecasts, or "json" for structured periods as in get_forecast
+        start_hour: First local hour of the hourly window, 0-23; omit for no hourly forecast
+        end_hour: Local hour the hourly window ends at (exclusive), 1-24
+    """
+    hourly = start_hour is not None and end_hour is not None
+    if hourly and not 0 <= start_hour < end_hour <= 24:
+        return "Invalid window: need 0 <= start_hour < end_hour <= 24."
+
+    coordinates = [(float(location["latitude"]), float(location["longitude"])) for location in locations]
+    gridpoints, forecast_by_key, hourly_by_key = await fetch_forecasts(coordinates, hourly=hourly)
+
+    results = []
+    for (latitude, longitude), gridpoint in zip(coordinates, gridpoints):
+        result = {"latitude": latitude, "longitude": longitude}
+        if not gridpoint:
+            result["error"] = "Unable to fetch forecast data for this location."
+        else:
+            result["gridpoint"] = gridpoint.key
+            result["alerts"] = [alert.compact() for alert in alerts_table.for_point(
+                latitude, longitude, (gridpoint.forecast_zone, gridpoint.county))]
+            forecast_data = forecast_by_key[gridpoint.key]
+            if forecast_data and format == "json":
+                result["forecast"] = compact_forecast(forecast_data, gridpoint.key)["periods"]
+            elif forecast_data:
+                result["forecast"] = format_forecast(forecast_data)
+            else:
+                result["error"] = "Unable to fetch detailed forecast."
+            if hourly:
+                hourly_data = hourly_by_key[gridpoint.key]
+                if hourly_data:
+                    day, periods = hourly_window(hourly_data, start_hour, end_hour)
+                    result["hourly"] = {"date": day.isoformat() if day else None, "periods": periods}
+                else:
+                    result["hourly"] = None
+        results.append(result)
+
+    logger.info(f"get_forecasts: {len(coordinates)} locations, {len(forecast_by_key)} distinct grid squares")
+    return json.dumps(results, separators=(",", ":"))
+
+
+@mcp.tool()
+async def seed_gridpoints(locations: list[dict[str, float]]) -> str:
+    """Resolve and cache the NWS grid squares of many locations ahead of time.
+
+    Args:
+        locations: List of {"latitude": ..., "longitude": ...} objects, e.g. all subscriber locations
+    """
+    coordinates = {gridpoint_cache.key_for(float(location["latitude"]), float(location["longitude"]))
+                   for location in locations}
+    missing = [point for point in coordinates if point not in gridpoint_cache]
+
+    gridpoints = await gather_limited(lambda point: resolve_gridpoint(*point), missing)
+    resolved = [gridpoint is not None for gridpoint in gridpoints]
+    return (
+        f"{len(coordinates)} locations: {len(coordinates) - len(missing)} already cached, "
+        f"{sum(resolved)} resolved, {len(missing) - sum(resolved)} failed"
+    )
+
+
+@mcp.tool()
+async def prefetch_forecasts(locations: list[dict[str, float]]) -> str:
+    """Warm the gridpoint, forecast and hourly forecast caches for many locations, e.g. every subscriber shortly before the daily run.
+
+    Returns a JSON report of the prefetch with the coverage (share of its grid
+    squares with a fresh forecast, and with a fresh hourly forecast, cached)
+    and staleness of the cached forecasts.
+
+    Args:
+        locations: List of {"latitude": ..., "longitude": ...} objects
+    """
+    global last_prefetch
+    started = time.perf_counter()
+    coordinates = [(float(location["latitude"]), float(location["longitude"])) for location in locations]
+    gridpoints, forecast_by_key, hourly_by_key = await fetch_forecasts(coordinates, hourly=True)
+
+    last_prefetch = PrefetchRun(
+        locations=len(coordinates),
+        forecast_urls={gridpoint.key: gridpoint.forecast_url for gridpoint in gridpoints if gridpoint},
+        failed=[key for key, forecast in forecast_by_key.items() if not forecast],
+        hourly_urls={gridpoint.key: gridpoint.forecast_hourly_url for gridpoint in gridpoints if gridpoint},
+        failed_hourly=[key for key, forecast in hourly_by_key.items() if not forecast],
+        unresolved=sum(gridpoint is None for gridpoint in gridpoints),
+        duration_ms=(time.perf_counter() - started) * 1000,
+    )
+    report = last_prefetch.report(http_cache)
+    logger.info(f"prefetch_forecasts: {report}")
+    return json.dumps(report, separators=(",", ":"))
+
+
+@mcp.tool()
+async def prefetch_status() -> str:
+    """Report the coverage and staleness of the last forecast prefetch, as JSON"""
+    return json.dumps(last_prefetch.report(http_cache) if last_prefetch else None, separators=(",", ":"))
+
+
+# Cache statistics for monitoring
+async def stats(request: Request) -> JSONResponse:
+    return JSONResponse({
+        "gridpoint_cache": gridpoint_cache.stats(),
+        "http_cache": http_cache.stats(),
+        "alerts": alerts_table.stats(),
+        "coalescing": in_flight.stats(),
+        "prefetch": last_prefetch.report(http_cache) if last_prefetch else None,
+    })
+
+
 # HTML for the homepage that displays "MCP Server"
 async def homepage(request: Request) -> HTMLResponse:
     html_content = """
@@ -227,11 +680,27 @@ def create_starlette_app(mcp_server: Server, *, debug: bool = False) -> Starlett
                 mcp_server.create_initialization_options(),
             )
 
+    # Open the shared NWS client and start the alerts refresh with the app; stop both on shutdown
+    @contextlib.asynccontextmanager
+    async def lifespan(app: Starlette):
+        global http_client
+        http_client = create_http_client()
+        alerts_task = asyncio.create_task(refresh_alerts_periodically())
+        try:
+            yield
+        finally:
+            alerts_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await alerts_task
+            await http_client.aclose()
+
     # Create and return the Starlette application
     return Starlette(
         debug=debug,
+        lifespan=lifespan,
         routes=[
             Route("/", endpoint=homepage),  # Add the homepage route
+            Route("/stats", endpoint=stats),  # Cache statistics
             Route("/sse", endpoint=handle_sse),  # Endpoint for SSE connections
             Mount("/messages/", app=sse.handle_post_message),  # Endpoint for messages
         ],
@@ -0,0 +1,48 @@
+"""Coalescing of concurrent identical upstream requests.
+
+When several tool calls need the same NWS resource at once (a burst of
+requests from one neighbourhood, or a parallel batch), only the first one
+makes the request; the others wait for its result instead of starting their
+own round trip.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable, TypeVar
+
+R = TypeVar("R")
+
+
+class SingleFlight:
+    """Share one in-flight call per key among all concurrent callers."""
+
+    def __init__(self):
+        self._in_flight: dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.executions = 0
+        self.collapsed = 0   # Calls that joined an in-flight call instead of making their own
+
+    async def do(self, key: Hashable, function: Callable[[], Awaitable[R]]) -> R:
+        """Await `function()`, or the call already in flight for `key`"""
+        self.calls += 1
+        task = self._in_flight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(function())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.collapsed += 1
+        # A cancelled caller must not cancel the call the others are waiting on
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Future):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "upstream": self.executions,
+            "collapsed": self.collapsed,
+            "collapse_ratio": round(self.collapsed / self.calls, 4) if self.calls else None,
+            "in_flight": len(self._in_flight),
+        }
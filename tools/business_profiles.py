@@ -0,0 +1,96 @@
+import re
+from datetime import date
+from functools import lru_cache
+from typing import Dict, List, Optional, Pattern, Tuple
+
+from tools.event_records import EventRecord
+
+# Keywords describing the events whose audience is likely to visit each kind of
+# business. Keys are matched against the business type the user entered.
+BUSINESS_KEYWORDS = {
+    'coffee': ['coffee', 'cafe', 'breakfast', 'brunch', 'book', 'study', 'networking', 'workshop', 'meetup'],
+    'cafe': ['coffee', 'cafe', 'breakfast', 'brunch', 'book', 'study', 'networking', 'workshop', 'meetup'],
+    'ice cream': ['ice cream', 'dessert', 'family', 'kids', 'festival', 'outdoor', 'park', 'summer'],
+    'dessert': ['dessert', 'sweet', 'family', 'kids', 'festival', 'date night'],
+    'bakery': ['bakery', 'baking', 'brunch', 'market', 'family', 'holiday'],
+    'restaurant': ['food', 'dinner', 'tasting', 'wine', 'date night', 'concert', 'festival', 'theater'],
+    'bar': ['beer', 'wine', 'cocktail', 'happy hour', 'trivia', 'live music', 'concert', 'game'],
+    'brewery': ['beer', 'brew', 'trivia', 'live music', 'happy hour', 'festival'],
+    'pizza': ['food', 'game', 'sports', 'family', 'kids', 'concert'],
+    'retail': ['market', 'shopping', 'pop-up', 'craft', 'fashion', 'art', 'holiday'],
+    'boutique': ['market', 'shopping', 'pop-up', 'fashion', 'art', 'craft'],
+    'gym': ['fitness', 'run', 'yoga', 'wellness', 'workout', '5k'],
+    'fitness': ['fitness', 'run', 'yoga', 'wellness', 'workout', '5k'],
+    'salon': ['wedding', 'prom', 'gala', 'fashion', 'beauty'],
+    'book': ['book', 'author', 'reading', 'writing', 'poetry', 'library'],
+}
+
+# Words that say nothing about which events are relevant
+GENERIC_WORDS = {'and', 'the', 'shop', 'store', 'parlor', 'company', 'business', 'services', 'llc', 'inc'}
+
+
+def keywords_for_business(business_type: str) -> List[str]:
+    """
+    Return the event keywords relevant to a business type.
+
+    Known business types map to their curated keyword list; otherwise the
+    words of the business type itself are used.
+    """
+    business_type = (business_type or '').lower()
+    keywords = []
+    for key, profile in BUSINESS_KEYWORDS.items():
+        if re.search(rf"\b{re.escape(key)}(?:s|es)?\b", business_type):
+            keywords.extend(keyword for keyword in profile if keyword not in keywords)
+
+    if not keywords:
+        keywords = [word for word in re.findall(r"[a-z]+", business_type) if len(word) > 2 and word not in GENERIC_WORDS]
+    return keywords
+
+
+def search_query_for_business(business_type: str) -> str:
+    """
+    Build a `websearch_to_tsquery` expression that matches any keyword of the
+    business type, e.g. 'coffee OR cafe OR "live music"'.
+    """
+    terms = []
+    for keyword in keywords_for_business(business_type):
+        keyword = keyword.replace('"', '')
+        terms.append(f'"{keyword}"' if ' ' in keyword else keyword)
+    return ' OR '.join(terms)
+
+
+@lru_cache(maxsize=256)
+def _keywords_pattern(keywords: Tuple[str, ...]) -> Optional[Pattern]:
+    """Whole-word pattern for the keywords, allowing plurals as the full-text stemmer does"""
+    if not keywords:
+        return None
+    alternatives = '|'.join(r'\s+'.join(re.escape(word) for word in keyword.split()) for keyword in keywords)
+    return re.compile(rf"\b(?:{alternatives})(?:s|es)?\b")
+
+
+def event_matches_keywords(event: EventRecord, keywords: List[str]) -> bool:
+    """
+    Whether an event's name or summary mentions any of the keywords as whole
+    words, like the full-text match in SQL ('art' does not match "party").
+    """
+    pattern = _keywords_pattern(tuple(keywords))
+    return bool(pattern and pattern.search(f"{event.name} {event.summary or ''}".lower()))
+
+
+def rank_events(events: List[EventRecord], business_type: str, distances: Dict[int, float],
+                today: date, k: int = 5) -> List[EventRecord]:
+    """
+    Rank already-fetched events with the same score as EventsTool's ranked
+    SQL query: recency, distance of the event's postal code and keyword match
+    (a whole-word match here instead of the full-text match).
+    """
+    keywords = keywords_for_business(business_type)
+
+    def score(event: EventRecord) -> float:
+        return (
+            1.0 / (1 + (today - event.start_date).days)
+            + 0.5 / (1 + distances.get(event.postal_code, 0.0))
+            + (1.0 if event_matches_keywords(event, keywords) else 0.0)
+        )
+
+    return sorted(events, key=lambda event: (-score(event), -event.start_date.toordinal(), event.name))[:k]
@@ -0,0 +1,144 @@
+from collections import Counter
+from datetime import date
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+
+class EventRecord(NamedTuple):
+    """A single event row, trimmed to the fields the recommendation uses.
+
+    Summaries are cut to 200 characters in SQL, so a record never holds the
+    full event description.
+    """
+    name: str
+    start_date: date
+    venue_name: Optional[str]
+    postal_code: Optional[int]
+    summary: Optional[str]
+    is_online_event: bool = False
+    category: Optional[str] = None
+
+    @classmethod
+    def from_row(cls, row) -> "EventRecord":
+        """Build a record from an asyncpg row (or any mapping with the event columns)"""
+        return cls(row['name'], row['start_date'], row['venue_name'], row['postal_code'], row['summary'],
+                   bool(row['is_online_event']), row['category'])
+
+
+def render_event(event: EventRecord) -> str:
+    """Render one event as the `Event:/Date:/Venue:` block handed to the agents"""
+    return (
+        f"Event: {event.name}\n"
+        f"Date: {event.start_date}\n"
+        f"Venue: {event.venue_name or 'Not specified'}\n"
+        f"Postal Code: {event.postal_code or 'Not specified'}\n"
+        f"Summary: {event.summary or 'No summary available'}..."
+    )
+
+
+def render_events(events: Iterable[EventRecord]) -> str:
+    """Render a list of events, separated by blank lines"""
+    return "\n\n".join(render_event(event) for event in events)
+
+
+class EventSummary(NamedTuple):
+    """Aggregated view of a postal code's events over a trailing window.
+
+    Its size depends only on `top_k` and `days_back`, not on how many events
+    the postal code has.
+    """
+    postal_code: str
+    days_back: int
+    todays_count: int
+    window_count: int
+    counts_by_day: List[Tuple[date, int]]
+    counts_by_venue: List[Tuple[str, int]]
+    counts_by_format: Dict[str, int]
+    counts_by_category: Dict[str, int]
+    todays_top_events: List[str]
+    recent_top_events: List[str]
+
+    @classmethod
+    def from_records(cls, postal_code: str, days_back: int, today: date,
+                     recent_events: List[EventRecord], top_k: int = 5) -> "EventSummary":
+        """
+        Build the same summary the SQL aggregation returns from already-fetched
+        records, e.g. the ones handed out by a batch fetch.
+
+        `recent_events` must be ordered by date (newest first) and name.
+        """
+        counts_by_day = Counter(event.start_date for event in recent_events)
+        venue_counts = Counter(event.venue_name for event in recent_events if event.venue_name)
+        format_counts = Counter('Online' if event.is_online_event else 'In person' for event in recent_events)
+        category_counts = Counter(event.category or 'Other' for event in recent_events)
+        todays_names = sorted(event.name for event in recent_events if event.start_date == today)
+
+        return cls(
+            postal_code=str(postal_code),
+            days_back=days_back,
+            todays_count=counts_by_day.get(today, 0),
+            window_count=len(recent_events),
+            counts_by_day=sorted(counts_by_day.items(), reverse=True),
+            counts_by_venue=sorted(venue_counts.items(), key=lambda item: (-item[1], item[0]))[:top_k],
+            counts_by_format=dict(format_counts),
+            counts_by_category=dict(category_counts.most_common()),
+            todays_top_events=todays_names[:top_k],
+            recent_top_events=[event.name for event in recent_events[:top_k]],
+        )
+
+
+class HourlyTraffic(NamedTuple):
+    """Events running in one hour of the day around a location.
+
+    `hour` is the local hour (0-23), or -1 for events listed without a start
+    time. Events that do not state a capacity count with a default attendance.
+    """
+    hour: int
+    event_count: int
+    expected_attendance: int
+
+
+class BaselineComparison(NamedTuple):
+    """Today's event count for a postal code next to its rolling baseline.
+
+    `dimension` is 'day' (all days of the window), 'weekday' (days falling on
+    today's weekday) or 'category' (events of the category named by `key`).
+    """
+    window_days: int
+    dimension: str
+    key: str
+    today: int
+    mean: float
+    stddev: float
+    sample_count: int
+
+    @property
+    def z_score(self) -> float:
+        """How many standard deviations today is above (or below) normal.
+
+        The deviation is floored at one event so a quiet, steady area does not
+        turn a single extra event into an extreme score.
+        """
+        return (self.today - self.mean) / max(self.stddev, 1.0)
+
+
+class BusinessEvents(NamedTuple):
+    """Everything the recommendation uses about the events around one business."""
+    summary: EventSummary
+    relevant_events: List[EventRecord]
+    relevant_todays_events: List[EventRecord]
+    activity_baseline: List[BaselineComparison]
+    hourly_traffic: List[HourlyTraffic]
+
+
+class PostalCodeEvents(NamedTuple):
+    """A postal code's events and activity context, as prefetched for the daily run.
+
+    The events cover the postal code's neighbourhood, like the event summary.
+    The baselines are the postal code's own: the Lambda maintains them per
+    5-digit ZIP, so they compare the ZIP's count today with its usual count,
+    not the neighbourhood's. The hourly traffic is around the ZIP's centroid.
+    """
+    todays_events: List[EventRecord]
+    recent_events: List[EventRecord]
+    activity_baseline: List[BaselineComparison]
+    hourly_traffic: List[HourlyTraffic]
@@ -0,0 +1,127 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional, Tuple, Union
+
+from decouple import config
+
+
+class EventsCache:
+    """Bounded LRU cache with per-entry TTL for EventsTool query results.
+
+    Keys are tuples whose second element is the postal code, so entries can be
+    invalidated per postal code after a crawl. Empty results are cached as
+    well, with their own (shorter) TTL.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 900, negative_ttl_seconds: float = 300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any, bool]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Return (found, value) for a key, dropping it if it has expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+
+            expires_at, value, negative = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return False, None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            if negative:
+                self.negative_hits += 1
+            return True, value
+
+    def set(self, key: Hashable, value: Any, negative: bool = False) -> None:
+        """Store a value, evicting the least recently used entries when full"""
+        ttl = self.negative_ttl_seconds if negative else self.ttl_seconds
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value, negative)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any], is_negative: Callable[[Any], bool]) -> Any:
+        """Return the cached value for a key, calling `loader` on a miss.
+
+        Exceptions raised by the loader propagate and nothing is cached.
+        """
+        found, value = self.get(key)
+        if found:
+            return value
+
+        value = loader()
+        self.set(key, value, negative=is_negative(value))
+        return value
+
+    async def get_or_load_async(self, key: Hashable, loader: Callable[[], Awaitable[Any]],
+                                is_negative: Callable[[Any], bool]) -> Any:
+        """Async version of `get_or_load`; `loader` returns an awaitable"""
+        found, value = self.get(key)
+        if found:
+            return value
+
+        value = await loader()
+        self.set(key, value, negative=is_negative(value))
+        return value
+
+    def invalidate(self, postal_code: Union[str, int, Iterable, None] = None) -> int:
+        """Drop the entries for one or several postal codes, or every entry if none is given.
+
+        Entries without a postal code (queries over all postal codes or around
+        a location) may include events of any of them, so they are dropped too.
+        """
+        with self._lock:
+            if postal_code is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                return removed
+
+            postal_codes = [postal_code] if isinstance(postal_code, (str, int)) else postal_code
+            postal_codes = {str(code) for code in postal_codes}
+            stale = [key for key in self._entries if len(key) > 1 and (key[1] is None or str(key[1]) in postal_codes)]
+            for key in stale:
+                del self._entries[key]
+            return len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the current size of the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "negative_hits": self.negative_hits,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def _setting(name: str, default: str) -> str:
+    return os.environ.get(name) or config(name, default=default)
+
+
+# Shared by every EventsTool instance in the process, so requests for the same
+# (postal_code, date) reuse one query result.
+events_cache = EventsCache(
+    max_entries=int(_setting('EVENTS_CACHE_MAX_ENTRIES', '512')),
+    ttl_seconds=float(_setting('EVENTS_CACHE_TTL_SECONDS', '900')),
+    negative_ttl_seconds=float(_setting('EVENTS_CACHE_NEGATIVE_TTL_SECONDS', '300')),
+)
@@ -0,0 +1,212 @@
+"""
+Read-only snapshot of the day's events, shared by every worker through mmap.
+
+After the EventBrite crawl a single process writes the events, activity
+baselines and hourly traffic of each subscriber postal code to one file:
+
+    header | postal codes (uint32, sorted) | offsets (uint64) | lengths (uint32) | payloads
+
+Each payload is the compact JSON array [events, baselines, traffic] of that
+postal code's events over the trailing window, its baseline comparisons and
+today's traffic per hour. Workers memory-map the file, so the data lives once in the
+page cache instead of once per worker, and a lookup is a binary search over
+the mapped postal code array plus decoding one payload, with no database
+round trip.
+
+The file is replaced atomically; readers notice the new file on their next
+lookup and keep using the old mapping until then.
+"""
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+from array import array
+from bisect import bisect_left
+from datetime import date
+from typing import Dict, Optional
+
+from tools.event_records import BaselineComparison, EventRecord, HourlyTraffic, PostalCodeEvents
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EVENTS_SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'events_snapshot.bin')
+
+FILE_MAGIC = b'EVSN'
+FILE_VERSION = 2
+_HEADER = struct.Struct('<4sIIII')  # magic, version, day (ordinal), days_back, postal code count
+
+
+def _postal_code_number(postal_code) -> Optional[int]:
+    digits = str(postal_code).strip().split('-')[0]
+    return int(digits) if digits.isdigit() else None
+
+
+def _encode_payload(events: PostalCodeEvents) -> bytes:
+    rows = [
+        [event.name, event.start_date.isoformat(), event.venue_name, event.postal_code,
+         event.summary, event.is_online_event, event.category]
+        for event in events.recent_events
+    ]
+    baselines = [list(comparison) for comparison in events.activity_baseline]
+    traffic = [list(hour) for hour in events.hourly_traffic]
+    return json.dumps([rows, baselines, traffic], separators=(',', ':')).encode('utf-8')
+
+
+def _decode_payload(payload, day: date) -> PostalCodeEvents:
+    rows, baselines, traffic = json.loads(payload)
+    recent_events = [
+        EventRecord(name, date.fromisoformat(start_date), venue_name, postal_code, summary, is_online_event, category)
+        for name, start_date, venue_name, postal_code, summary, is_online_event, category in rows
+    ]
+    return PostalCodeEvents(
+        [event for event in recent_events if event.start_date == day],
+        recent_events,
+        [BaselineComparison(*comparison) for comparison in baselines],
+        [HourlyTraffic(*hour) for hour in traffic],
+    )
+
+
+class EventsSnapshot:
+    """A memory-mapped events snapshot for one day and trailing window."""
+
+    def __init__(self, mapped, day: date, days_back: int, postal_codes, offsets, lengths):
+        self._mapped = mapped
+        self.day = day
+        self.days_back = days_back
+        self._postal_codes = postal_codes
+        self._offsets = offsets
+        self._lengths = lengths
+
+    def __len__(self) -> int:
+        return len(self._postal_codes)
+
+    @classmethod
+    def open(cls, path: str) -> "EventsSnapshot":
+        """Memory-map a snapshot written by `write_snapshot`"""
+        with open(path, 'rb') as handle:
+            mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, day, days_back, count = _HEADER.unpack_from(mapped)
+        if magic != FILE_MAGIC or version != FILE_VERSION:
+            raise ValueError(f"{path} is not a version {FILE_VERSION} events snapshot")
+
+        view = memoryview(mapped)
+        start = _HEADER.size
+        postal_codes = view[start:start + 4 * count].cast('I')
+        start += 4 * count
+        offsets = view[start:start + 8 * count].cast('Q')
+        start += 8 * count
+        lengths = view[start:start + 4 * count].cast('I')
+        return cls(mapped, date.fromordinal(day), days_back, postal_codes, offsets, lengths)
+
+    def get(self, postal_code) -> Optional[PostalCodeEvents]:
+        """
+        Return the events, baselines and hourly traffic of a postal code, or
+        None if the snapshot does not cover it. Recent events are ordered by
+        date (newest first) and name, like `EventsTool.fetch_recommendation_events`.
+        """
+        number = _postal_code_number(postal_code)
+        if number is None:
+            return None
+
+        position = bisect_left(self._postal_codes, number)
+        if position == len(self._postal_codes) or self._postal_codes[position] != number:
+            return None
+
+        offset = self._offsets[position]
+        return _decode_payload(self._mapped[offset:offset + self._lengths[position]], self.day)
+
+
+def write_snapshot(events_by_postal_code: Dict[str, PostalCodeEvents],
+                   day: date, days_back: int, path: Optional[str] = None) -> int:
+    """
+    Write the events, baselines and hourly traffic keyed by postal code, as
+    returned by `EventsTool.fetch_events_for_postal_codes`, to a snapshot file.
+
+    Returns the number of postal codes written.
+    """
+    path = path or os.environ.get('EVENTS_SNAPSHOT_PATH') or DEFAULT_EVENTS_SNAPSHOT_PATH
+
+    payloads = {}
+    for postal_code, events in events_by_postal_code.items():
+        number = _postal_code_number(postal_code)
+        if number is not None:
+            payloads[number] = _encode_payload(events)
+
+    postal_codes = array('I', sorted(payloads))
+    offsets = array('Q')
+    lengths = array('I')
+    offset = _HEADER.size + len(postal_codes) * (4 + 8 + 4)
+    for number in postal_codes:
+        offsets.append(offset)
+        lengths.append(len(payloads[number]))
+        offset += len(payloads[number])
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, 'wb') as handle:
+        handle.write(_HEADER.pack(FILE_MAGIC, FILE_VERSION, day.toordinal(), days_back, len(postal_codes)))
+        postal_codes.tofile(handle)
+        offsets.tofile(handle)
+        lengths.tofile(handle)
+        for number in postal_codes:
+            handle.write(payloads[number])
+    # Readers either see the old file or the complete new one
+    os.replace(temporary_path, path)
+    return len(postal_codes)
+
+
+def remove_snapshot(path: Optional[str] = None) -> bool:
+    """
+    Delete the snapshot file, e.g. when the events it holds have been
+    invalidated. Every worker stops using its mapping on its next lookup.
+
+    Returns whether there was a snapshot to delete.
+    """
+    path = path or os.environ.get('EVENTS_SNAPSHOT_PATH') or DEFAULT_EVENTS_SNAPSHOT_PATH
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+_snapshot: Optional[EventsSnapshot] = None
+_snapshot_signature = None
+_snapshot_lock = threading.Lock()
+
+
+def get_events_snapshot() -> Optional[EventsSnapshot]:
+    """Return the current snapshot, re-opening it when the file has been replaced.
+
+    Returns None when no snapshot has been written yet.
+    """
+    global _snapshot, _snapshot_signature
+    path = os.environ.get('EVENTS_SNAPSHOT_PATH') or DEFAULT_EVENTS_SNAPSHOT_PATH
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    if signature != _snapshot_signature:
+        with _snapshot_lock:
+            if signature != _snapshot_signature:
+                try:
+                    _snapshot = EventsSnapshot.open(path)
+                    logger.info(f"Loaded events snapshot for {_snapshot.day} with {len(_snapshot)} postal codes")
+                except (OSError, ValueError, struct.error) as e:
+                    logger.warning(f"Could not open events snapshot {path}: {e}")
+                    _snapshot = None
+                _snapshot_signature = signature
+    return _snapshot
+
+
+def snapshot_info() -> Dict[str, object]:
+    """Describe the current snapshot for health checks"""
+    snapshot = get_events_snapshot()
+    if snapshot is None:
+        return {'available': False}
+    return {'available': True, 'day': snapshot.day.isoformat(), 'days_back': snapshot.days_back, 'postal_codes': len(snapshot)}
@@ -1,14 +1,177 @@
 import os
+import json
 import asyncpg
 import asyncio
+from collections import Counter
 from datetime import datetime, timedelta
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Tuple
 from decouple import config
 
+from tools.events_cache import EventsCache, events_cache
+from tools.events_snapshot import get_events_snapshot
+from tools.event_records import (BaselineComparison, BusinessEvents, EventRecord, EventSummary, HourlyTraffic,
+                                 PostalCodeEvents, render_events)
+from tools.business_profiles import search_query_for_business
+from tools.zip_index import cells_within, get_zip_index, postal_code_number
+
+# Columns shared by every event query; summaries are trimmed in SQL so only
+# the part we show is sent over the wire.
+EVENT_COLUMNS = """name, start_date, venue_name, postal_code, LEFT(summary, 200) AS summary,
+    COALESCE(is_online_event, false) AS is_online_event, COALESCE(category, 'Other') AS category"""
+
+# Counts and top-K names for a postal code's trailing window, computed in
+# Postgres so only the aggregates come back. $1 postal codes, $2/$3 window
+# bounds ($3 is today), $4 top-K.
+EVENT_SUMMARY_QUERY = """
+    WITH window_events AS (
+        SELECT name, start_date, venue_name, COALESCE(is_online_event, false) AS is_online_event,
+            COALESCE(category, 'Other') AS category
+        FROM events
+        WHERE postal_code = ANY($1::int[])
+        AND start_date BETWEEN $2 AND $3
+    )
+    SELECT
+        (SELECT count(*) FROM window_events WHERE start_date = $3) AS todays_count,
+        (SELECT count(*) FROM window_events) AS window_count,
+        (SELECT COALESCE(json_agg(json_build_array(start_date, n) ORDER BY start_date DESC), '[]')
+         FROM (SELECT start_date, count(*) AS n FROM window_events GROUP BY start_date) d) AS by_day,
+        (SELECT COALESCE(json_agg(json_build_array(venue_name, n) ORDER BY n DESC, venue_name), '[]')
+         FROM (SELECT venue_name, count(*) AS n FROM window_events
+               WHERE COALESCE(venue_name, '') <> ''
+               GROUP BY venue_name ORDER BY n DESC, venue_name LIMIT $4) v) AS by_venue,
+        (SELECT COALESCE(json_object_agg(format, n), '{}')
+         FROM (SELECT CASE WHEN is_online_event THEN 'Online' ELSE 'In person' END AS format, count(*) AS n
+               FROM window_events GROUP BY 1) f) AS by_format,
+        (SELECT COALESCE(json_object_agg(category, n), '{}')
+         FROM (SELECT category, count(*) AS n FROM window_events GROUP BY 1) c) AS by_category,
+        (SELECT COALESCE(json_agg(name ORDER BY name), '[]')
+         FROM (SELECT name FROM window_events WHERE start_date = $3 ORDER BY name LIMIT $4) t) AS todays_top,
+        (SELECT COALESCE(json_agg(name ORDER BY start_date DESC, name), '[]')
+         FROM (SELECT name, start_date FROM window_events ORDER BY start_date DESC, name LIMIT $4) r) AS recent_top
+"""
+
+# One pre-aggregated row per (postal_code, day), maintained by the EventBrite
+# Lambda when it saves events.
+DAILY_SUMMARY_QUERY = """
+    SELECT day, event_count, online_count, venue_counts, top_events, category_counts
+    FROM event_daily_summary
+    WHERE postal_code = ANY($1::int[])
+    AND day BETWEEN $2 AND $3
+    ORDER BY day DESC, postal_code
+"""
+
+# Rolling baselines maintained by the EventBrite Lambda, each next to today's
+# matching count from event_daily_summary. $1 postal codes, $2 today, $3
+# today's ISO weekday.
+ACTIVITY_BASELINE_QUERY = """
+    SELECT b.postal_code, b.window_days, b.dimension, b.key, b.sample_count, b.mean, b.stddev,
+        CASE WHEN b.dimension = 'category'
+            THEN COALESCE((s.category_counts ->> b.key)::int, 0)
+            ELSE COALESCE(s.event_count, 0)
+        END AS today
+    FROM event_baselines b
+    LEFT JOIN event_daily_summary s
+        ON s.postal_code = b.postal_code AND s.day = $2
+    WHERE b.postal_code = ANY($1::int[])
+    AND (b.dimension <> 'weekday' OR b.key = $3)
+    ORDER BY b.postal_code, b.window_days, b.dimension, b.key
+"""
+
+
+# Grid cell size in degrees of the event_density index (~2.2 km north-south, at
+# most half the default neighbour radius so the cells around a business hug
+# its search circle); must match DENSITY_CELL_DEGREES in
+# eventbrite-lambda/package/event_schema.py
+DENSITY_CELL_DEGREES = 0.02
+
+# Today's rows of the event_density index maintained by the EventBrite Lambda
+# for a set of grid cells; one primary-key range per cell. Summed per location
+# client-side, so the cells of many locations are read in one query. $1 today,
+# $2/$3 cell rows and columns.
+HOURLY_TRAFFIC_QUERY = """
+    SELECT d.cell_row, d.cell_col, d.hour, d.event_count, d.expected_attendance
+    FROM unnest($2::int[], $3::int[]) AS c(cell_row, cell_col)
+    JOIN event_density d
+        ON d.day = $1 AND d.cell_row = c.cell_row AND d.cell_col = c.cell_col
+"""
+
+
+# Top-K events ranked in SQL by recency, distance from the business and a
+# full-text keyword match against the business type. $1/$2 nearby postal codes
+# and their distances in km, $3/$4 window bounds ($4 is today), $5 websearch
+# query, $6 K.
+RANKED_EVENTS_QUERY = f"""
+    SELECT {EVENT_COLUMNS}
+    FROM (
+        SELECT e.*,
+            1.0 / (1 + ($4::date - e.start_date))
+            + 0.5 / (1 + n.distance_km)
+            + CASE WHEN e.search_vector @@ websearch_to_tsquery('english', $5) THEN 1.0 ELSE 0 END
+            AS score
+        FROM events e
+        JOIN unnest($1::int[], $2::float8[]) AS n(postal_code, distance_km)
+            ON e.postal_code = n.postal_code
+        WHERE e.start_date BETWEEN $3 AND $4
+    ) ranked
+    ORDER BY score DESC, start_date DESC, name
+    LIMIT $6
+"""
+
+
+# Today's events matching a business's keyword profile, ranked by full-text
+# relevance using the GIN index on search_vector. $1 today, $2 postal codes,
+# $3 websearch query, $4 K.
+RELEVANT_TODAYS_EVENTS_QUERY = f"""
+    SELECT {EVENT_COLUMNS}
+    FROM events, websearch_to_tsquery('english', $3) AS query
+    WHERE start_date = $1
+    AND postal_code = ANY($2::int[])
+    AND search_vector @@ query
+    ORDER BY ts_rank(search_vector, query) DESC, name
+    LIMIT $4
+"""
+
+
+# Until the event schema migration (eventbrite-lambda/package/event_schema.py)
+# has run, events has no category or search_vector column and
+# event_daily_summary no category_counts. Queries failing on a missing column
+# are retried with these stand-ins: every event counts as 'Other', and the
+# search vector is computed on the fly instead of read from the GIN index.
+SEARCH_VECTOR_EXPRESSION = "to_tsvector('english', COALESCE(name, '') || ' ' || COALESCE(summary, ''))"
+PRE_MIGRATION_STAND_INS = [
+    ("COALESCE(category, 'Other')", "'Other'::text"),
+    ("top_events, category_counts", "top_events, '{}' AS category_counts"),
+    ("e.search_vector", SEARCH_VECTOR_EXPRESSION),
+    ("search_vector", SEARCH_VECTOR_EXPRESSION),
+]
+
+
+def _pre_migration_query(query: str) -> str:
+    """Rewrite a query to run against the events schema from before the migration"""
+    for column, stand_in in PRE_MIGRATION_STAND_INS:
+        query = query.replace(column, stand_in)
+    return query
+
+
+async def _optional(label: str, lookup, default):
+    """Await a lookup that only adds context, yielding `default` when it fails"""
+    try:
+        return await lookup
+    except Exception as e:
+        print(f"Could not fetch {label}: {e}")
+        return default
+
+
 class EventsTool:
-    """Tool for directly accessing event data from the RDS PostgreSQL database."""
-    
-    def __init__(self):
+    """Tool for directly accessing event data from the RDS PostgreSQL database.
+
+    Every public query has an `_async` counterpart with the same semantics and
+    cache, for callers that already run an event loop (e.g. several lookups
+    under `asyncio.gather`). The synchronous methods run on a private loop in
+    a worker thread.
+    """
+
+    def __init__(self, cache: Optional[EventsCache] = None):
         # Database connection parameters from environment variables or .env
         self.db_host = os.environ.get('DB_HOST') or config('DB_HOST', default='eventbrite-events-db-instance-1.crymic44oulo.us-east-2.rds.amazonaws.com')
         self.db_name = os.environ.get('DB_NAME') or config('DB_NAME', default='events_db')
@@ -16,187 +179,807 @@ class EventsTool:
         self.db_password = os.environ.get('DB_PASSWORD') or config('DB_PASSWORD', default='Amazonwebservices777!')
         self.db_port = int(os.environ.get('DB_PORT') or config('DB_PORT', default='5432'))
         self.pool = None
-        
+        # asyncpg pools (and the lock guarding their creation) belong to the loop that created them
+        self._pool_loop = None
+        self._pool_lock = None
+        # Query results are shared across instances through the process-wide cache
+        self.cache = cache if cache is not None else events_cache
+        # Read summaries from the event_daily_summary table instead of aggregating raw events
+        self.use_summary_table = (os.environ.get('EVENTS_USE_SUMMARY_TABLE') or config('EVENTS_USE_SUMMARY_TABLE', default='true')).lower() == 'true'
+        # Events within this distance of the postal code's centroid count as local (0 = exact match only)
+        self.neighbour_radius_km = float(os.environ.get('EVENTS_NEIGHBOUR_RADIUS_KM') or config('EVENTS_NEIGHBOUR_RADIUS_KM', default='5'))
+
     async def _init_db_pool(self):
-        """Initialize the database connection pool if it doesn't exist"""
+        """Initialize the database connection pool for the running loop if it doesn't exist"""
+        loop = asyncio.get_running_loop()
+        if self._pool_loop is not loop:
+            # A pool from another (finished) loop cannot be used here
+            self.pool = None
+            self._pool_lock = asyncio.Lock()
+            self._pool_loop = loop
+
         if self.pool is None:
-            try:
-                self.pool = await asyncpg.create_pool(
-                    host=self.db_host,
-                    database=self.db_name,
-                    user=self.db_user,
-                    password=self.db_password,
-                    port=self.db_port,
-                    min_size=1,
-                    max_size=10,
-                    command_timeout=60
-                )
-                print(f"Database connection pool established successfully")
-            except Exception as e:
-                print(f"Failed to create database pool: {str(e)}")
-                raise
+            # Concurrent lookups on one loop share a single pool
+            async with self._pool_lock:
+                if self.pool is not None:
+                    return
+                try:
+                    self.pool = await asyncpg.create_pool(
+                        host=self.db_host,
+                        database=self.db_name,
+                        user=self.db_user,
+                        password=self.db_password,
+                        port=self.db_port,
+                        min_size=1,
+                        max_size=10,
+                        command_timeout=60
+                    )
+                    print(f"Database connection pool established successfully")
+                except Exception as e:
+                    print(f"Failed to create database pool: {str(e)}")
+                    raise
 
-    async def _get_todays_events_async(self, postal_code: Optional[str] = None) -> str:
-        """Get events happening today from the database"""
+    def _nearby_postal_codes(self, postal_code) -> List[Tuple[int, float]]:
+        """Return (postal_code, distance_km) for the postal code and its neighbours within the configured radius"""
+        return get_zip_index().within(postal_code, self.neighbour_radius_km)
+
+    def _postal_codes_for(self, postal_code) -> List[int]:
+        """Expand a postal code to itself plus its neighbours within the configured radius"""
+        return [code for code, _ in self._nearby_postal_codes(postal_code)]
+
+    async def _fetch_with_retry(self, query: str, *args):
+        """Fetch rows, falling back to the pre-migration schema if a derived column is missing"""
+        try:
+            return await self._fetch_with_reconnect(query, *args)
+        except asyncpg.exceptions.UndefinedColumnError as e:
+            print(f"Event schema not migrated yet ({e}), querying without the derived columns")
+            return await self._fetch_with_reconnect(_pre_migration_query(query), *args)
+
+    async def _fetch_with_reconnect(self, query: str, *args):
+        """Fetch rows, retrying once on another connection after a connection error.
+
+        The pool is shared by concurrent lookups, so it is never closed here:
+        asyncpg drops the broken connection when it is released and the retry
+        acquires a working one.
+        """
         await self._init_db_pool()
-        
+        pool = self.pool
         try:
-            async with self.pool.acquire() as connection:
-                # Get today's date
-                today = datetime.now().date()
-                
-                # Base query for today's events using correct column names
-                base_query = """
-                    SELECT name, start_date, venue_name, postal_code, summary
-                    FROM events 
-                    WHERE start_date = $1
-                """
-                
-                # Add postal code filter if provided
-                if postal_code:
-                    query = base_query + " AND postal_code = $2 ORDER BY name"
-                    rows = await connection.fetch(query, today, int(postal_code))
-                else:
-                    query = base_query + " ORDER BY name"
-                    rows = await connection.fetch(query, today)
-                
-                if not rows:
-                    location_filter = f" in postal code {postal_code}" if postal_code else ""
-                    return f"No events found for today{location_filter}."
-                
-                # Format the results
-                events_list = []
-                for row in rows:
-                    event_info = f"""
-Event: {row['name']}
-Date: {row['start_date']}
-Venue: {row['venue_name'] or 'Not specified'}
-Postal Code: {row['postal_code'] or 'Not specified'}
-Summary: {row['summary'][:200] if row['summary'] else 'No summary available'}...
-                    """
-                    events_list.append(event_info.strip())
-                
-                return f"Found {len(events_list)} events for today:\n\n" + "\n\n".join(events_list)
-                
+            async with pool.acquire() as connection:
+                return await connection.fetch(query, *args)
         except Exception as e:
-            return f"Error retrieving today's events: {str(e)}"    
-    async def _get_events_by_postal_code_async(self, postal_code: str, days_back: int = 7) -> str:
+            if "connection" not in str(e).lower():
+                raise
+            print(f"Connection error detected, retrying on another connection: {e}")
+            async with pool.acquire() as connection:
+                return await connection.fetch(query, *args)
+
+    async def _query_todays_events_async(self, postal_code: Optional[str] = None) -> List[EventRecord]:
+        """Get events happening today from the database"""
+        today = datetime.now().date()
+
+        if postal_code:
+            query = f"""
+                SELECT {EVENT_COLUMNS}
+                FROM events
+                WHERE start_date = $1 AND postal_code = ANY($2::int[])
+                ORDER BY name
+            """
+            rows = await self._fetch_with_retry(query, today, self._postal_codes_for(postal_code))
+        else:
+            query = f"""
+                SELECT {EVENT_COLUMNS}
+                FROM events
+                WHERE start_date = $1
+                ORDER BY name
+            """
+            rows = await self._fetch_with_retry(query, today)
+
+        return [EventRecord.from_row(row) for row in rows]
+
+    async def _query_window_events_async(self, postal_codes: List[int], days_back: int = 7) -> List[EventRecord]:
+        """Get the events of any of the given postal codes for the last specified number of days"""
+        if not postal_codes:
+            return []
+        end_date = datetime.now().date()
+        start_date = end_date - timedelta(days=days_back)
+
+        query = f"""
+            SELECT {EVENT_COLUMNS}
+            FROM events
+            WHERE postal_code = ANY($1::int[])
+            AND start_date BETWEEN $2 AND $3
+            ORDER BY start_date DESC, name
+        """
+        rows = await self._fetch_with_retry(query, postal_codes, start_date, end_date)
+
+        return [EventRecord.from_row(row) for row in rows]
+
+    async def _query_events_by_postal_code_async(self, postal_code: str, days_back: int = 7) -> List[EventRecord]:
         """Get events by postal code for the last specified number of days"""
-        await self._init_db_pool()
-        
+        return await self._query_window_events_async(self._postal_codes_for(postal_code), days_back)
+
+    async def _query_events_for_postal_codes_async(self, postal_codes, days_back: int = 7) -> Dict[str, PostalCodeEvents]:
+        """Get today's and the trailing window's events, baselines and hourly traffic for many postal codes.
+
+        The union of every postal code's neighbourhood is fetched once and
+        partitioned in memory, so the events of each postal code are the same
+        as `_query_recommendation_events_async` would return. The baselines of
+        all postal codes and the density cells around all their centroids are
+        read with one query each, concurrently with the events.
+        """
+        today = datetime.now().date()
+        neighbourhoods = {str(postal_code): set(self._postal_codes_for(postal_code)) for postal_code in postal_codes}
+        all_codes = sorted(set().union(*neighbourhoods.values())) if neighbourhoods else []
+        centroids = {postal_code: get_zip_index().centroid(postal_code) for postal_code in neighbourhoods}
+        located = [postal_code for postal_code, centroid in centroids.items() if centroid is not None]
+
+        rows, baselines, traffic = await asyncio.gather(
+            self._query_window_events_async(all_codes, days_back),
+            _optional("activity baselines", self._query_activity_baselines_async(list(neighbourhoods)), {}),
+            _optional("hourly event traffic", self._query_hourly_traffic_for_locations_async(
+                [centroids[postal_code] for postal_code in located], self.neighbour_radius_km), [[] for _ in located]),
+        )
+        traffic_by_postal_code = dict(zip(located, traffic))
+
+        results = {}
+        for postal_code, codes in neighbourhoods.items():
+            recent_events = [event for event in rows if event.postal_code in codes]
+            todays_events = [event for event in recent_events if event.start_date == today]
+            results[postal_code] = PostalCodeEvents(
+                todays_events,
+                recent_events,
+                baselines.get(postal_code_number(postal_code), []),
+                traffic_by_postal_code.get(postal_code, []),
+            )
+        return results
+
+    async def _query_recommendation_events_async(self, postal_code: str, days_back: int = 7) -> Tuple[List[EventRecord], List[EventRecord]]:
+        """Get today's events and the trailing window's events with a single query.
+
+        Today's rows are part of the trailing window, so one range query is
+        split client-side instead of making two round trips.
+        """
+        today = datetime.now().date()
+        recent_events = await self._query_events_by_postal_code_async(postal_code, days_back)
+        todays_events = [event for event in recent_events if event.start_date == today]
+        return todays_events, recent_events
+
+    async def _query_ranked_events_async(self, postal_code: str, business_type: str, k: int = 5, days_back: int = 7) -> List[EventRecord]:
+        """Get the K events most relevant to a business, ranked and limited in SQL"""
+        end_date = datetime.now().date()
+        start_date = end_date - timedelta(days=days_back)
+        nearby = self._nearby_postal_codes(postal_code)
+
+        rows = await self._fetch_with_retry(
+            RANKED_EVENTS_QUERY,
+            [code for code, _ in nearby],
+            [distance for _, distance in nearby],
+            start_date,
+            end_date,
+            search_query_for_business(business_type),
+            k,
+        )
+
+        return [EventRecord.from_row(row) for row in rows]
+
+    async def _query_relevant_todays_events_async(self, postal_code: str, business_type: str, k: int = 5) -> List[EventRecord]:
+        """Get today's events matching the business type's keywords, ranked with the full-text index"""
+        search_query = search_query_for_business(business_type)
+        if not search_query:
+            return []
+
+        rows = await self._fetch_with_retry(
+            RELEVANT_TODAYS_EVENTS_QUERY,
+            datetime.now().date(),
+            self._postal_codes_for(postal_code),
+            search_query,
+            k,
+        )
+
+        return [EventRecord.from_row(row) for row in rows]
+
+    async def _query_event_summary_async(self, postal_code: str, days_back: int = 7, top_k: int = 5,
+                                         from_summary_table: Optional[bool] = None) -> EventSummary:
+        """Get an event summary, from the daily summary table when available"""
+        if from_summary_table is None:
+            from_summary_table = self.use_summary_table
+
+        if from_summary_table:
+            try:
+                return await self._read_daily_summary_async(postal_code, days_back, top_k)
+            except asyncpg.exceptions.UndefinedTableError:
+                print("event_daily_summary table not found, aggregating raw events instead")
+
+        return await self._aggregate_event_summary_async(postal_code, days_back, top_k)
+
+    async def _read_daily_summary_async(self, postal_code: str, days_back: int = 7, top_k: int = 5) -> EventSummary:
+        """Build an event summary from the pre-aggregated (postal_code, day) rows"""
+        end_date = datetime.now().date()
+        start_date = end_date - timedelta(days=days_back)
+
+        rows = await self._fetch_with_retry(DAILY_SUMMARY_QUERY, self._postal_codes_for(postal_code), start_date, end_date)
+
+        # One row per (postal_code, day) of the neighbourhood
+        counts_by_day = Counter()
+        venue_counts = Counter()
+        category_counts = Counter()
+        online_count = 0
+        names_by_day = {}
+        for row in rows:
+            counts_by_day[row['day']] += row['event_count']
+            venue_counts.update(json.loads(row['venue_counts']))
+            category_counts.update(json.loads(row['category_counts']))
+            online_count += row['online_count']
+            names_by_day.setdefault(row['day'], []).extend(json.loads(row['top_events']))
+
+        # Each row lists its postal code's first names of the day alphabetically, so
+        # merging them gives the neighbourhood's first names, ordered like the raw
+        # aggregation (newest day first, then by name) as long as top_k does not
+        # exceed the Lambda's SUMMARY_TOP_EVENTS
+        recent_top_events = [
+            name for day in sorted(names_by_day, reverse=True) for name in sorted(names_by_day[day])
+        ][:top_k]
+        todays_top_events = sorted(names_by_day.get(end_date, []))[:top_k]
+
+        todays_count = counts_by_day.get(end_date, 0)
+        window_count = sum(counts_by_day.values())
+        counts_by_format = {}
+        if window_count - online_count:
+            counts_by_format['In person'] = window_count - online_count
+        if online_count:
+            counts_by_format['Online'] = online_count
+
+        return EventSummary(
+            postal_code=str(postal_code),
+            days_back=days_back,
+            todays_count=todays_count,
+            window_count=window_count,
+            counts_by_day=sorted(counts_by_day.items(), reverse=True),
+            counts_by_venue=sorted(venue_counts.items(), key=lambda item: (-item[1], item[0]))[:top_k],
+            counts_by_format=counts_by_format,
+            counts_by_category=dict(category_counts.most_common()),
+            todays_top_events=todays_top_events,
+            recent_top_events=recent_top_events,
+        )
+
+    async def _aggregate_event_summary_async(self, postal_code: str, days_back: int = 7, top_k: int = 5) -> EventSummary:
+        """Get event counts by day, venue and format plus the top-K event names, aggregated in SQL"""
+        end_date = datetime.now().date()
+        start_date = end_date - timedelta(days=days_back)
+
+        rows = await self._fetch_with_retry(EVENT_SUMMARY_QUERY, self._postal_codes_for(postal_code), start_date, end_date, top_k)
+        row = rows[0]
+
+        return EventSummary(
+            postal_code=str(postal_code),
+            days_back=days_back,
+            todays_count=row['todays_count'],
+            window_count=row['window_count'],
+            counts_by_day=[(datetime.strptime(day, "%Y-%m-%d").date(), n) for day, n in json.loads(row['by_day'])],
+            counts_by_venue=[(venue, n) for venue, n in json.loads(row['by_venue'])],
+            counts_by_format=json.loads(row['by_format']),
+            counts_by_category=dict(Counter(json.loads(row['by_category'])).most_common()),
+            todays_top_events=json.loads(row['todays_top']),
+            recent_top_events=json.loads(row['recent_top']),
+        )
+
+    async def _query_activity_baselines_async(self, postal_codes) -> Dict[int, List[BaselineComparison]]:
+        """Get today's counts next to the rolling baselines of many postal codes, keyed by 5-digit ZIP"""
+        numbers = sorted({number for number in map(postal_code_number, postal_codes) if number is not None})
+        if not numbers:
+            return {}
+
+        today = datetime.now().date()
+        try:
+            rows = await self._fetch_with_retry(ACTIVITY_BASELINE_QUERY, numbers, today, str(today.isoweekday()))
+        except asyncpg.exceptions.UndefinedTableError:
+            print("event_baselines table not found, no baseline available")
+            return {}
+
+        baselines = {}
+        for row in rows:
+            baselines.setdefault(row['postal_code'], []).append(
+                BaselineComparison(row['window_days'], row['dimension'], row['key'], row['today'],
+                                   row['mean'], row['stddev'], row['sample_count'])
+            )
+        return baselines
+
+    async def _query_activity_baseline_async(self, postal_code: str) -> List[BaselineComparison]:
+        """Get today's counts next to the postal code's rolling baselines"""
+        baselines = await self._query_activity_baselines_async([postal_code])
+        return baselines.get(postal_code_number(postal_code), [])
+
+    async def _query_hourly_traffic_for_locations_async(self, locations: List[Tuple[float, float]],
+                                                        radius_km: float) -> List[List[HourlyTraffic]]:
+        """Get today's events per hour in the grid cells around each location, reading all cells in one query"""
+        cells_by_location = [
+            cells_within(latitude, longitude, radius_km, DENSITY_CELL_DEGREES) for latitude, longitude in locations
+        ]
+        all_cells = sorted(set().union(*cells_by_location)) if cells_by_location else []
+        if not all_cells:
+            return [[] for _ in locations]
+
         try:
-            async with self.pool.acquire() as connection:
-                # Calculate date range
-                end_date = datetime.now().date()
-                start_date = end_date - timedelta(days=days_back)
-                
-                # Fixed query using correct column names
-                query = """
-                    SELECT name, start_date, venue_name, postal_code, summary
-                    FROM events 
-                    WHERE postal_code = $1 
-                    AND start_date BETWEEN $2 AND $3
-                    ORDER BY start_date DESC, name
-                """
-                
-                # Ensure we have a fresh connection by checking if it's valid
-                await connection.execute("SELECT 1")
-                
-                rows = await connection.fetch(query, int(postal_code), start_date, end_date)
-                
-                if not rows:
-                    return f"No events found in postal code {postal_code} for the last {days_back} days."
-                
-                # Format the results
-                events_list = []
-                for row in rows:
-                    event_info = f"""
-Event: {row['name']}
-Date: {row['start_date']}
-Venue: {row['venue_name'] or 'Not specified'}
-Postal Code: {row['postal_code'] or 'Not specified'}
-Summary: {row['summary'][:200] if row['summary'] else 'No summary available'}...
-                    """
-                    events_list.append(event_info.strip())
-                
-                return f"Found {len(events_list)} events in postal code {postal_code} (last {days_back} days):\n\n" + "\n\n".join(events_list)
-                
+            rows = await self._fetch_with_retry(
+                HOURLY_TRAFFIC_QUERY, datetime.now().date(), [row for row, _ in all_cells], [col for _, col in all_cells])
+        except asyncpg.exceptions.UndefinedTableError:
+            print("event_density table not found, no hourly traffic available")
+            return [[] for _ in locations]
+
+        rows_by_cell = {}
+        for row in rows:
+            rows_by_cell.setdefault((row['cell_row'], row['cell_col']), []).append(row)
+
+        traffic = []
+        for cells in cells_by_location:
+            event_counts = Counter()
+            attendance = Counter()
+            for cell in cells:
+                for row in rows_by_cell.get(cell, ()):
+                    event_counts[row['hour']] += row['event_count']
+                    attendance[row['hour']] += row['expected_attendance']
+            traffic.append([HourlyTraffic(hour, event_counts[hour], attendance[hour]) for hour in sorted(event_counts)])
+        return traffic
+
+    async def _query_hourly_traffic_async(self, latitude: float, longitude: float, radius_km: float) -> List[HourlyTraffic]:
+        """Get today's events per hour in the grid cells around a location"""
+        [traffic] = await self._query_hourly_traffic_for_locations_async([(latitude, longitude)], radius_km)
+        return traffic
+
+    def _cache_key(self, kind: str, postal_code, *params) -> tuple:
+        """Cache key for a query: kind, postal code, today's date and the query parameters"""
+        return (kind, str(postal_code) if postal_code else None, datetime.now().date().isoformat()) + params
+
+    async def fetch_todays_events_async(self, postal_code: Optional[str] = None) -> List[EventRecord]:
+        """Async version of `fetch_todays_events`"""
+        return await self.cache.get_or_load_async(
+            self._cache_key("today", postal_code),
+            lambda: self._query_todays_events_async(postal_code),
+            is_negative=lambda events: not events,
+        )
+
+    async def fetch_events_by_postal_code_async(self, postal_code: str, days_back: int = 7) -> List[EventRecord]:
+        """Async version of `fetch_events_by_postal_code`"""
+        return await self.cache.get_or_load_async(
+            self._cache_key("window", postal_code, days_back),
+            lambda: self._query_events_by_postal_code_async(postal_code, days_back),
+            is_negative=lambda events: not events,
+        )
+
+    async def fetch_recommendation_events_async(self, postal_code: str, days_back: int = 7) -> Tuple[List[EventRecord], List[EventRecord]]:
+        """Async version of `fetch_recommendation_events`"""
+        snapshot_events = self.fetch_snapshot_events(postal_code, days_back)
+        if snapshot_events is not None:
+            return snapshot_events.todays_events, snapshot_events.recent_events
+        return await self.cache.get_or_load_async(
+            self._cache_key("recommendation", postal_code, days_back),
+            lambda: self._query_recommendation_events_async(postal_code, days_back),
+            is_negative=lambda result: not result[1],
+        )
+
+    async def fetch_event_summary_async(self, postal_code: str, days_back: int = 7, top_k: int = 5) -> EventSummary:
+        """Async version of `fetch_event_summary`"""
+        return await self.cache.get_or_load_async(
+            self._cache_key("summary", postal_code, days_back, top_k),
+            lambda: self._query_event_summary_async(postal_code, days_back, top_k),
+            is_negative=lambda summary: summary.window_count == 0,
+        )
+
+    async def fetch_ranked_events_async(self, postal_code: str, business_type: str, k: int = 5, days_back: int = 7) -> List[EventRecord]:
+        """Async version of `fetch_ranked_events`"""
+        return await self.cache.get_or_load_async(
+            self._cache_key("ranked", postal_code, days_back, (business_type or '').lower(), k),
+            lambda: self._query_ranked_events_async(postal_code, business_type, k, days_back),
+            is_negative=lambda events: not events,
+        )
+
+    async def fetch_relevant_todays_events_async(self, postal_code: str, business_type: str, k: int = 5) -> List[EventRecord]:
+        """Async version of `fetch_relevant_todays_events`"""
+        return await self.cache.get_or_load_async(
+            self._cache_key("relevant_today", postal_code, (business_type or '').lower(), k),
+            lambda: self._query_relevant_todays_events_async(postal_code, business_type, k),
+            is_negative=lambda events: not events,
+        )
+
+    async def fetch_activity_baseline_async(self, postal_code: str) -> List[BaselineComparison]:
+        """Async version of `fetch_activity_baseline`"""
+        return await self.cache.get_or_load_async(
+            self._cache_key("baseline", postal_code),
+            lambda: self._query_activity_baseline_async(postal_code),
+            is_negative=lambda comparisons: not comparisons,
+        )
+
+    async def fetch_hourly_traffic_async(self, latitude: float, longitude: float, radius_km: Optional[float] = None) -> List[HourlyTraffic]:
+        """Async version of `fetch_hourly_traffic`"""
+        radius_km = self.neighbour_radius_km if radius_km is None else radius_km
+        return await self.cache.get_or_load_async(
+            self._cache_key("traffic", None, round(latitude, 3), round(longitude, 3), radius_km),
+            lambda: self._query_hourly_traffic_async(latitude, longitude, radius_km),
+            is_negative=lambda traffic: not traffic,
+        )
+
+    async def fetch_business_events_async(self, postal_code: str, business_type: str,
+                                          latitude: Optional[float] = None, longitude: Optional[float] = None,
+                                          days_back: int = 7, k: int = 5) -> BusinessEvents:
+        """Async version of `fetch_business_events`"""
+        async def hourly_traffic():
+            if latitude is None or longitude is None:
+                return []
+            return await self.fetch_hourly_traffic_async(latitude, longitude)
+
+        summary, relevant_events, relevant_todays_events, activity_baseline, traffic = await asyncio.gather(
+            self.fetch_event_summary_async(postal_code, days_back),
+            self.fetch_ranked_events_async(postal_code, business_type, k, days_back),
+            self.fetch_relevant_todays_events_async(postal_code, business_type, k),
+            # The baselines and traffic only add context; the recommendation works without them
+            _optional("activity baseline", self.fetch_activity_baseline_async(postal_code), []),
+            _optional("hourly event traffic", hourly_traffic(), []),
+        )
+        return BusinessEvents(summary, relevant_events, relevant_todays_events, activity_baseline, traffic)
+
+    async def fetch_events_for_postal_codes_async(self, postal_codes, days_back: int = 7) -> Dict[str, PostalCodeEvents]:
+        """Async version of `fetch_events_for_postal_codes`"""
+        postal_codes = sorted({str(postal_code) for postal_code in postal_codes if postal_code})
+        results = await self._query_events_for_postal_codes_async(postal_codes, days_back)
+        self._cache_batch_results(results, days_back)
+        return results
+
+    async def get_todays_events_async(self, postal_code: Optional[str] = None) -> str:
+        """Async version of `get_todays_events`"""
+        try:
+            events = await self.fetch_todays_events_async(postal_code)
+        except Exception as e:
+            return f"Error retrieving today's events: {str(e)}"
+        return _render_todays_events(events, postal_code)
+
+    async def get_events_by_postal_code_async(self, postal_code: str, days_back: int = 7) -> str:
+        """Async version of `get_events_by_postal_code`"""
+        try:
+            events = await self.fetch_events_by_postal_code_async(postal_code, days_back)
         except Exception as e:
-            # If we get a connection error, try to reset the pool
-            if "connection" in str(e).lower():
-                print(f"Connection error detected, resetting pool: {e}")
-                if self.pool:
-                    await self.pool.close()
-                    self.pool = None
-                await self._init_db_pool()
-                # Retry once with fresh pool
-                try:
-                    async with self.pool.acquire() as connection:
-                        rows = await connection.fetch(query, int(postal_code), start_date, end_date)
-                        if not rows:
-                            return f"No events found in postal code {postal_code} for the last {days_back} days."
-                        
-                        events_list = []
-                        for row in rows:
-                            event_info = f"""
-Event: {row['name']}
-Date: {row['start_date']}
-Venue: {row['venue_name'] or 'Not specified'}
-Postal Code: {row['postal_code'] or 'Not specified'}
-Summary: {row['summary'][:200] if row['summary'] else 'No summary available'}...
-                            """
-                            events_list.append(event_info.strip())
-                        
-                        return f"Found {len(events_list)} events in postal code {postal_code} (last {days_back} days):\n\n" + "\n\n".join(events_list)
-                except Exception as retry_e:
-                    return f"Error retrieving events for postal code {postal_code} (retry failed): {str(retry_e)}"
-            
             return f"Error retrieving events for postal code {postal_code}: {str(e)}"
+        return _render_recent_events(events, postal_code, days_back)
+
+    def _cache_batch_results(self, results, days_back: int):
+        """Store batch results under the keys `fetch_recommendation_events` and `fetch_activity_baseline` read"""
+        for postal_code, result in results.items():
+            self.cache.set(self._cache_key("recommendation", postal_code, days_back),
+                           (result.todays_events, result.recent_events), negative=not result.recent_events)
+            self.cache.set(self._cache_key("baseline", postal_code), result.activity_baseline,
+                           negative=not result.activity_baseline)
 
     def _run_sync(self, coro):
         """Helper to run async code in sync context"""
         import concurrent.futures
         import threading
-        
+
         def run_in_thread():
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
             try:
                 return loop.run_until_complete(coro)
             finally:
+                # The pool cannot outlive this loop, so release its connections now
+                loop.run_until_complete(self.close())
                 loop.close()
-        
+
         with concurrent.futures.ThreadPoolExecutor() as executor:
             future = executor.submit(run_in_thread)
             return future.result()
 
+    def fetch_todays_events(self, postal_code: Optional[str] = None) -> List[EventRecord]:
+        """
+        Get today's events as records, optionally filtered by postal code.
+
+        Args:
+            postal_code (str, optional): Optional postal code to filter events
+
+        Returns:
+            List[EventRecord]: Events happening today, ordered by name
+        """
+        return self.cache.get_or_load(
+            self._cache_key("today", postal_code),
+            lambda: self._run_sync(self._query_todays_events_async(postal_code)),
+            is_negative=lambda events: not events,
+        )
+
+    def fetch_events_by_postal_code(self, postal_code: str, days_back: int = 7) -> List[EventRecord]:
+        """
+        Get the events of a postal code within the last `days_back` days as records.
+
+        Args:
+            postal_code (str): Postal code to search for events
+            days_back (int): Number of days back to search (default: 7)
+
+        Returns:
+            List[EventRecord]: Events ordered by date (newest first) and name
+        """
+        return self.cache.get_or_load(
+            self._cache_key("window", postal_code, days_back),
+            lambda: self._run_sync(self._query_events_by_postal_code_async(postal_code, days_back)),
+            is_negative=lambda events: not events,
+        )
+
+    def fetch_recommendation_events(self, postal_code: str, days_back: int = 7) -> Tuple[List[EventRecord], List[EventRecord]]:
+        """
+        Get today's events and the events of the trailing window in one database round trip.
+
+        Args:
+            postal_code (str): Postal code to search for events
+            days_back (int): Number of days back to search (default: 7)
+
+        Returns:
+            Tuple[List[EventRecord], List[EventRecord]]: Today's events and the events of the last `days_back` days
+        """
+        snapshot_events = self.fetch_snapshot_events(postal_code, days_back)
+        if snapshot_events is not None:
+            return snapshot_events.todays_events, snapshot_events.recent_events
+        return self.cache.get_or_load(
+            self._cache_key("recommendation", postal_code, days_back),
+            lambda: self._run_sync(self._query_recommendation_events_async(postal_code, days_back)),
+            is_negative=lambda result: not result[1],
+        )
+
+    def fetch_event_summary(self, postal_code: str, days_back: int = 7, top_k: int = 5) -> EventSummary:
+        """
+        Get aggregate event counts and the top-K events for a postal code.
+
+        Args:
+            postal_code (str): Postal code to summarize
+            days_back (int): Number of days back to include (default: 7)
+            top_k (int): Number of venues and event names to return (default: 5)
+
+        Returns:
+            EventSummary: Counts by day, venue and format plus top event names
+        """
+        return self.cache.get_or_load(
+            self._cache_key("summary", postal_code, days_back, top_k),
+            lambda: self._run_sync(self._query_event_summary_async(postal_code, days_back, top_k)),
+            is_negative=lambda summary: summary.window_count == 0,
+        )
+
+    def fetch_ranked_events(self, postal_code: str, business_type: str, k: int = 5, days_back: int = 7) -> List[EventRecord]:
+        """
+        Get the K events most relevant to a business, whatever the density of the area.
+
+        Events are scored by recency, distance of their postal code from the
+        business and whether they mention keywords for the business type.
+
+        Args:
+            postal_code (str): The business's postal code
+            business_type (str): Business type used to derive relevance keywords
+            k (int): Maximum number of events to return (default: 5)
+            days_back (int): Number of days back to consider (default: 7)
+
+        Returns:
+            List[EventRecord]: Up to K events, most relevant first
+        """
+        return self.cache.get_or_load(
+            self._cache_key("ranked", postal_code, days_back, (business_type or '').lower(), k),
+            lambda: self._run_sync(self._query_ranked_events_async(postal_code, business_type, k, days_back)),
+            is_negative=lambda events: not events,
+        )
+
+    def fetch_relevant_todays_events(self, postal_code: str, business_type: str, k: int = 5) -> List[EventRecord]:
+        """
+        Get today's events that match the business type's keyword profile.
+
+        Matching and ranking use the full-text index on event names and
+        summaries, so only relevant events come back.
+
+        Args:
+            postal_code (str): The business's postal code
+            business_type (str): Business type used to derive the keyword profile
+            k (int): Maximum number of events to return (default: 5)
+
+        Returns:
+            List[EventRecord]: Up to K of today's events, most relevant first
+        """
+        return self.cache.get_or_load(
+            self._cache_key("relevant_today", postal_code, (business_type or '').lower(), k),
+            lambda: self._run_sync(self._query_relevant_todays_events_async(postal_code, business_type, k)),
+            is_negative=lambda events: not events,
+        )
+
+    def fetch_activity_baseline(self, postal_code: str) -> List[BaselineComparison]:
+        """
+        Compare today's event counts with the postal code's normal activity.
+
+        The 7- and 30-day baselines (overall, for today's weekday and per
+        category) are maintained at ingest, so this is a single indexed lookup
+        rather than a scan of past events.
+
+        Baselines are kept per 5-digit ZIP ('66213-1234' reads those of 66213)
+        and cover that ZIP alone, whereas the event summary and event lists
+        include the neighbouring postal codes within the configured radius.
+
+        Args:
+            postal_code (str): Postal code to compare
+
+        Returns:
+            List[BaselineComparison]: Today's count, baseline mean/stddev and z-score per dimension
+        """
+        return self.cache.get_or_load(
+            self._cache_key("baseline", postal_code),
+            lambda: self._run_sync(self._query_activity_baseline_async(postal_code)),
+            is_negative=lambda comparisons: not comparisons,
+        )
+
+    def fetch_hourly_traffic(self, latitude: float, longitude: float, radius_km: Optional[float] = None) -> List[HourlyTraffic]:
+        """
+        Get the expected event foot traffic around a location for each hour of today.
+
+        Reads the grid cell x hour density index built at ingest, so the cost
+        depends on the number of cells the radius covers, not on the number
+        of events.
+
+        Args:
+            latitude (float): Latitude of the business
+            longitude (float): Longitude of the business
+            radius_km (float, optional): Search radius (default: the neighbour radius)
+
+        Returns:
+            List[HourlyTraffic]: Event count and expected attendance per hour, earliest first
+        """
+        radius_km = self.neighbour_radius_km if radius_km is None else radius_km
+        return self.cache.get_or_load(
+            self._cache_key("traffic", None, round(latitude, 3), round(longitude, 3), radius_km),
+            lambda: self._run_sync(self._query_hourly_traffic_async(latitude, longitude, radius_km)),
+            is_negative=lambda traffic: not traffic,
+        )
+
+    def fetch_business_events(self, postal_code: str, business_type: str,
+                              latitude: Optional[float] = None, longitude: Optional[float] = None,
+                              days_back: int = 7, k: int = 5) -> BusinessEvents:
+        """
+        Get the event summary, relevant events, activity baseline and hourly
+        traffic for one business.
+
+        The five lookups run concurrently on one event loop and connection
+        pool, instead of one loop and pool per lookup. Each is cached like
+        the corresponding `fetch_*` method. A failed baseline or traffic lookup
+        yields an empty list.
+
+        Args:
+            postal_code (str): The business's postal code
+            business_type (str): Business type used to rank and match events
+            latitude (float, optional): Latitude of the business, for the hourly traffic
+            longitude (float, optional): Longitude of the business, for the hourly traffic
+            days_back (int): Number of days back to consider (default: 7)
+            k (int): Maximum number of relevant events of each kind (default: 5)
+
+        Returns:
+            BusinessEvents: Summary, relevant events, today's relevant events, baselines and hourly traffic
+        """
+        return self._run_sync(self.fetch_business_events_async(postal_code, business_type, latitude, longitude, days_back, k))
+
+    def fetch_snapshot_events(self, postal_code: str, days_back: int = 7) -> Optional[PostalCodeEvents]:
+        """
+        Get today's and the trailing window's events, baselines and hourly traffic from the shared events snapshot.
+
+        The snapshot is a memory-mapped file written after the daily crawl, so
+        this is a local lookup without a database round trip.
+
+        Args:
+            postal_code (str): Postal code to look up
+            days_back (int): Number of days back (default: 7)
+
+        Returns:
+            Optional[PostalCodeEvents]: Today's and recent events, baselines and hourly traffic, or
+            None if there is no snapshot for today with this window and postal code
+        """
+        snapshot = get_events_snapshot()
+        if snapshot is None or snapshot.day != datetime.now().date() or snapshot.days_back != days_back:
+            return None
+        return snapshot.get(postal_code)
+
+    def fetch_events_for_postal_codes(self, postal_codes, days_back: int = 7) -> Dict[str, PostalCodeEvents]:
+        """
+        Get today's and the trailing window's events, activity baselines and
+        hourly traffic for many postal codes.
+
+        The events, the baselines and the density cells are read with one
+        query each, run concurrently on one pool. Hourly traffic is around
+        each postal code's centroid. Each postal code's events and baselines
+        are also stored in the cache under the keys `fetch_recommendation_events`
+        and `fetch_activity_baseline` use.
+
+        Args:
+            postal_codes (Iterable[str]): Postal codes to fetch, e.g. those of all registered users
+            days_back (int): Number of days back to search (default: 7)
+
+        Returns:
+            Dict[str, PostalCodeEvents]: Events, baselines and hourly traffic keyed by postal code
+        """
+        postal_codes = sorted({str(postal_code) for postal_code in postal_codes if postal_code})
+        results = self._run_sync(self._query_events_for_postal_codes_async(postal_codes, days_back))
+        self._cache_batch_results(results, days_back)
+        return results
+
     def get_todays_events(self, postal_code: Optional[str] = None) -> str:
         """
         Get events happening today, optionally filtered by postal code.
-        
+
         Args:
             postal_code (str, optional): Optional postal code to filter events
-            
+
         Returns:
             str: List of events happening today
         """
-        return self._run_sync(self._get_todays_events_async(postal_code))
+        try:
+            events = self.fetch_todays_events(postal_code)
+        except Exception as e:
+            return f"Error retrieving today's events: {str(e)}"
+        return _render_todays_events(events, postal_code)
 
     def get_events_by_postal_code(self, postal_code: str, days_back: int = 7) -> str:
         """
         Get events for a specific postal code within the last specified number of days.
-        
+
         Args:
             postal_code (str): Postal code to search for events
             days_back (int): Number of days back to search (default: 7)
-            
+
         Returns:
             str: List of events in the specified postal code
         """
-        return self._run_sync(self._get_events_by_postal_code_async(postal_code, days_back))
+        try:
+            events = self.fetch_events_by_postal_code(postal_code, days_back)
+        except Exception as e:
+            return f"Error retrieving events for postal code {postal_code}: {str(e)}"
+        return _render_recent_events(events, postal_code, days_back)
+
+    def get_recommendation_events(self, postal_code: str, days_back: int = 7) -> Tuple[str, str]:
+        """
+        Get today's events and the events of the trailing window in one database round trip.
+
+        Args:
+            postal_code (str): Postal code to search for events
+            days_back (int): Number of days back to search (default: 7)
+
+        Returns:
+            Tuple[str, str]: Today's events and the events of the last `days_back` days
+        """
+        try:
+            todays_events, recent_events = self.fetch_recommendation_events(postal_code, days_back)
+        except Exception as e:
+            error = f"Error retrieving events for postal code {postal_code}: {str(e)}"
+            return error, error
+        return (
+            _render_todays_events(todays_events, postal_code),
+            _render_recent_events(recent_events, postal_code, days_back),
+        )
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters of the event query cache"""
+        return self.cache.stats()
+
+    def invalidate_cache(self, postal_code: Optional[str] = None) -> int:
+        """Drop cached results for a postal code (or all of them), e.g. after a crawl.
+
+        The results of every postal code within the neighbour radius include
+        this postal code's events, so theirs are dropped as well.
+        """
+        if postal_code is None:
+            return self.cache.invalidate()
+        return self.cache.invalidate([str(postal_code), *self._postal_codes_for(postal_code)])
 
     async def close(self):
         """Close the database connection pool"""
         if self.pool:
             await self.pool.close()
             self.pool = None
+
+
+def _render_todays_events(events: List[EventRecord], postal_code: Optional[str] = None) -> str:
+    if not events:
+        location_filter = f" in postal code {postal_code}" if postal_code else ""
+        return f"No events found for today{location_filter}."
+    return f"Found {len(events)} events for today:\n\n" + render_events(events)
+
+
+def _render_recent_events(events: List[EventRecord], postal_code: str, days_back: int) -> str:
+    if not events:
+        return f"No events found in postal code {postal_code} for the last {days_back} days."
+    return f"Found {len(events)} events in postal code {postal_code} (last {days_back} days):\n\n" + render_events(events)
@@ -0,0 +1,254 @@
+"""
+Long-lived, health-checked MCP client sessions over SSE.
+
+Opening an SSE stream and running the MCP `initialize` handshake costs several
+round trips to the server. The pool keeps a few initialized sessions open on a
+background event loop so that a tool call is a single `call_tool` round trip.
+
+Each session is owned by its own task for its whole life, because the SSE
+client's cancel scopes must be entered and exited by the same task. Sessions
+idle for longer than `idle_ping_seconds` are pinged before use. A session that
+fails a ping is reconnected. A call that fails because the session's stream is
+gone is retried once on a reconnected session. A call that times out or fails
+in the tool itself is not retried, since running a slow batch call again from
+scratch only doubles the wait.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import anyio
+import httpx
+from decouple import config
+from mcp import ClientSession
+from mcp.client.sse import sse_client
+
+logger = logging.getLogger(__name__)
+
+# Errors meaning the SSE stream or its connection is gone, not that the call was slow or failed
+STREAM_ERRORS = (ConnectionError, httpx.TransportError, anyio.ClosedResourceError, anyio.BrokenResourceError,
+                 anyio.EndOfStream)
+
+
+def _is_stream_error(error: BaseException) -> bool:
+    # The MCP client fails the pending requests of a closed stream with "Connection closed"
+    return isinstance(error, STREAM_ERRORS) or "connection closed" in str(error).lower()
+
+
+class _PooledSession:
+    """One initialized ClientSession, kept open by a dedicated task."""
+
+    def __init__(self, server_url: str):
+        self.server_url = server_url
+        self.session: Optional[ClientSession] = None
+        self.last_used = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._connected: Optional[asyncio.Future] = None
+        self._stop: Optional[asyncio.Event] = None
+
+    @property
+    def alive(self) -> bool:
+        return self.session is not None and self._task is not None and not self._task.done()
+
+    async def connect(self, timeout: float):
+        """Open the SSE stream and run the MCP handshake"""
+        self._connected = asyncio.get_running_loop().create_future()
+        self._stop = asyncio.Event()
+        self._task = asyncio.create_task(self._serve())
+        try:
+            await asyncio.wait_for(asyncio.shield(self._connected), timeout)
+        except BaseException:
+            await self.close()
+            raise
+        self.last_used = time.monotonic()
+
+    async def _serve(self):
+        try:
+            async with sse_client(f"{self.server_url}/sse") as (read_stream, write_stream):
+                async with ClientSession(read_stream, write_stream) as session:
+                    await session.initialize()
+                    self.session = session
+                    self._connected.set_result(None)
+                    # Hold the contexts open until the session is closed
+                    await self._stop.wait()
+        except Exception as e:
+            if not self._connected.done():
+                self._connected.set_exception(e)
+            else:
+                logger.info(f"MCP session to {self.server_url} ended: {e}")
+        finally:
+            self.session = None
+
+    async def ping(self, timeout: float):
+        await asyncio.wait_for(self.session.send_ping(), timeout)
+        self.last_used = time.monotonic()
+
+    async def close(self, timeout: float = 5.0):
+        """Leave the session contexts from their owning task, cancelling it if it hangs"""
+        if self._task is None:
+            return
+        self._stop.set()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except (Exception, asyncio.CancelledError):
+            # The session is being discarded either way
+            pass
+        self._task = None
+        self.session = None
+
+
+class MCPSessionPool:
+    """A small pool of MCP sessions to one server, usable from any thread or event loop."""
+
+    def __init__(self, server_url: str, size: int = 2, idle_ping_seconds: float = 30.0,
+                 connect_timeout: float = 15.0, call_timeout: float = 60.0):
+        self.server_url = server_url
+        self.size = size
+        self.idle_ping_seconds = idle_ping_seconds
+        self.connect_timeout = connect_timeout
+        self.call_timeout = call_timeout
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        # Created on the pool's loop
+        self._available: Optional[asyncio.Semaphore] = None
+        self._idle: List[_PooledSession] = []
+        self._sessions: List[_PooledSession] = []
+
+        self.calls = 0
+        self.connects = 0
+        self.reconnects = 0
+        self.failed_pings = 0
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """Start the background loop that owns every session, once"""
+        with self._thread_lock:
+            if self._loop is None or not self._thread.is_alive():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="mcp-session-pool", daemon=True)
+                self._thread.start()
+        return self._loop
+
+    async def _acquire(self) -> _PooledSession:
+        if self._available is None:
+            self._available = asyncio.Semaphore(self.size)
+        await self._available.acquire()
+
+        if self._idle:
+            pooled = self._idle.pop()
+        else:
+            pooled = _PooledSession(self.server_url)
+            self._sessions.append(pooled)
+
+        try:
+            if not pooled.alive:
+                # Make sure a half-dead session's task is gone before replacing it
+                await pooled.close()
+                await pooled.connect(self.connect_timeout)
+                self.connects += 1
+            elif time.monotonic() - pooled.last_used > self.idle_ping_seconds:
+                try:
+                    await pooled.ping(self.connect_timeout)
+                except Exception as e:
+                    self.failed_pings += 1
+                    logger.info(f"MCP session to {self.server_url} failed its health check, reconnecting: {e}")
+                    await self._reconnect(pooled)
+            return pooled
+        except BaseException:
+            # Hand the slot back; the next caller reconnects the session
+            self._release(pooled)
+            raise
+
+    def _release(self, pooled: _PooledSession):
+        self._idle.append(pooled)
+        self._available.release()
+
+    async def _reconnect(self, pooled: _PooledSession):
+        await pooled.close()
+        await pooled.connect(self.connect_timeout)
+        self.reconnects += 1
+
+    async def _call_on_loop(self, tool_name: str, args: Dict[str, Any], timeout: Optional[float] = None):
+        timeout = self.call_timeout if timeout is None else timeout
+        pooled = await self._acquire()
+        try:
+            self.calls += 1
+            try:
+                result = await asyncio.wait_for(pooled.session.call_tool(tool_name, args), timeout)
+            except asyncio.TimeoutError:
+                raise
+            except Exception as e:
+                if pooled.alive and not _is_stream_error(e):
+                    raise
+                # The server dropped the stream (e.g. a redeploy); retry once on a new session
+                logger.info(f"MCP call {tool_name} lost its pooled session, reconnecting: {e}")
+                await self._reconnect(pooled)
+                result = await asyncio.wait_for(pooled.session.call_tool(tool_name, args), timeout)
+            pooled.last_used = time.monotonic()
+            return result
+        finally:
+            self._release(pooled)
+
+    async def call_tool_async(self, tool_name: str, args: Dict[str, Any], timeout: Optional[float] = None):
+        """Call a tool on a pooled session from any event loop, within `timeout` seconds (default: call_timeout)"""
+        future = asyncio.run_coroutine_threadsafe(self._call_on_loop(tool_name, args, timeout), self._ensure_loop())
+        return await asyncio.wrap_future(future)
+
+    def call_tool(self, tool_name: str, args: Dict[str, Any], timeout: Optional[float] = None):
+        """Call a tool on a pooled session, blocking the calling thread"""
+        future = asyncio.run_coroutine_threadsafe(self._call_on_loop(tool_name, args, timeout), self._ensure_loop())
+        return future.result()
+
+    async def _close_all(self):
+        await asyncio.gather(*(pooled.close() for pooled in self._sessions), return_exceptions=True)
+        self._sessions.clear()
+        self._idle.clear()
+
+    def close(self):
+        """Close every session and stop the background loop"""
+        with self._thread_lock:
+            if self._loop is None:
+                return
+            asyncio.run_coroutine_threadsafe(self._close_all(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+            self._loop = None
+            self._available = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Return call and connection counters"""
+        return {
+            'server_url': self.server_url,
+            'size': self.size,
+            'open_sessions': sum(1 for pooled in self._sessions if pooled.alive),
+            'calls': self.calls,
+            'connects': self.connects,
+            'reconnects': self.reconnects,
+            'failed_pings': self.failed_pings,
+        }
+
+
+_pools: Dict[str, MCPSessionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def _setting(name: str, default: str) -> str:
+    return os.environ.get(name) or config(name, default=default)
+
+
+def get_session_pool(server_url: str) -> MCPSessionPool:
+    """Return the process-wide session pool for an MCP server"""
+    with _pools_lock:
+        pool = _pools.get(server_url)
+        if pool is None:
+            pool = MCPSessionPool(
+                server_url,
+                size=int(_setting('MCP_SESSION_POOL_SIZE', '2')),
+                idle_ping_seconds=float(_setting('MCP_SESSION_IDLE_PING_SECONDS', '30')),
+            )
+            _pools[server_url] = pool
+        return pool
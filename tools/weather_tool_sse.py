@@ -1,7 +1,7 @@
 import asyncio
 import json
 import os
-from typing import Optional, Dict, Any, Type
+from typing import Optional, Dict, Any, List, Tuple, Type
 
 from langchain.tools import BaseTool
 from pydantic import BaseModel, Field, PrivateAttr
@@ -9,6 +9,12 @@ from pydantic import BaseModel, Field, PrivateAttr
 from mcp import ClientSession
 from mcp.client.sse import sse_client
 
+from tools.mcp_session_pool import get_session_pool
+from tools.zip_index import geocode_postal_code
+
+# Coordinates for 66213 (formatted to 4 decimals), used when a postal code cannot be geocoded
+DEFAULT_LOCATION = "38.9041,-94.6898"
+
 
 class WeatherToolInput(BaseModel):
     """Input schema for the weather tool"""
@@ -24,10 +30,33 @@ class MCPSSEWeatherTool(BaseTool):
     
     # Define server_url as a proper field
     server_url: str = Field(default="https://ptk4g7rrkh.us-east-2.awsapprunner.com", description="MCP server URL")
+    # Reuse initialized sessions from the process-wide pool instead of a handshake per call
+    use_session_pool: bool = Field(default=True, description="Call tools over pooled MCP sessions")
+    # "json" asks for compact structured forecast periods, "text" for prose
+    forecast_format: str = Field(default="json", description="Forecast output format: 'json' or 'text'")
+    # Local hours (start, end) of the hourly forecast added to coordinate lookups; None to leave it out
+    hourly_window: Optional[Tuple[int, int]] = Field(default=(10, 20), description="Hourly forecast window in local hours")
+    # Batch calls over every subscriber take far longer than a single lookup
+    batch_call_timeout: float = Field(default=300.0, description="Timeout in seconds of get_forecasts and prefetch_forecasts calls")
 
     def __init__(self, server_url: str = "https://ptk4g7rrkh.us-east-2.awsapprunner.com", **kwargs):
         super().__init__(server_url=server_url, **kwargs)
 
+    async def _call_tool(self, tool_name: str, args: dict, timeout: Optional[float] = None) -> str:
+        """Call a tool over a pooled session, or a fresh connection if pooling is disabled.
+
+        `timeout` overrides the pool's call timeout, e.g. for batch calls.
+        """
+        if not self.use_session_pool:
+            return await self._call_tool_with_fresh_connection(tool_name, args)
+        try:
+            result = await get_session_pool(self.server_url).call_tool_async(tool_name, args, timeout)
+            return _content_text(result.content) if hasattr(result, 'content') else str(result)
+        except asyncio.TimeoutError:
+            return f"Error calling {tool_name}: timed out"
+        except Exception as e:
+            return f"Error calling {tool_name}: {str(e)}"
+
     async def _call_tool_with_fresh_connection(self, tool_name: str, args: dict) -> str:
         """Call a tool with a fresh connection that gets cleaned up immediately"""
         try:
@@ -40,11 +69,86 @@ class MCPSSEWeatherTool(BaseTool):
                     
                     # Call the tool
                     result = await session.call_tool(tool_name, args)
-                    return result.content if hasattr(result, 'content') else str(result)
+                    return _content_text(result.content) if hasattr(result, 'content') else str(result)
                     
         except Exception as e:
             return f"Error calling {tool_name}: {str(e)}"
 
+    def get_forecasts(self, locations: List[Tuple[float, float]]) -> List[str]:
+        """
+        Get forecasts for many (latitude, longitude) pairs with one `get_forecasts` call.
+
+        The server fetches one forecast (and, with an hourly window, one hourly
+        forecast) per distinct NWS grid square, so nearby businesses share an
+        upstream request. Results are in input order and formatted like `_run`
+        output, hourly window included.
+        """
+        return asyncio.run(self._get_forecasts_async(locations))
+
+    async def _get_forecasts_async(self, locations: List[Tuple[float, float]]) -> List[str]:
+        args = {
+            "locations": [{"latitude": latitude, "longitude": longitude} for latitude, longitude in locations],
+            "format": self.forecast_format,
+        }
+        if self.hourly_window:
+            args["start_hour"], args["end_hour"] = self.hourly_window
+        content = await self._call_tool("get_forecasts", args, self.batch_call_timeout)
+        try:
+            items = json.loads(content)
+        except ValueError:
+            # The call itself failed
+            return [content] * len(locations)
+
+        results = []
+        for item in items:
+            if "forecast" in item:
+                forecast = item['forecast']
+                if not isinstance(forecast, str):
+                    forecast = json.dumps(forecast, separators=(',', ':'))
+                text = (
+                    f"Weather forecast for coordinates ({item['latitude']}, {item['longitude']}):\n{forecast}\n"
+                    f"{_render_alerts(item.get('alerts', []))}"
+                )
+                if self.hourly_window:
+                    # Same JSON as get_hourly_forecast returns; unavailable if the server had none
+                    hourly = ""
+                    if item.get('hourly'):
+                        hourly = json.dumps({"gridpoint": item.get('gridpoint'), **item['hourly']}, separators=(',', ':'))
+                    text += f"\n{_render_hourly(hourly, *self.hourly_window)}"
+                results.append(text)
+            else:
+                results.append(f"Error getting weather data: {item.get('error')}")
+        return results
+
+    def get_hourly_forecast(self, latitude: float, longitude: float, start_hour: int = 10, end_hour: int = 20) -> str:
+        """
+        Get today's hourly forecast for local hours start_hour up to end_hour,
+        as compact JSON periods sliced on the server, under a one-line heading.
+        """
+        return asyncio.run(self._get_hourly_forecast_async(latitude, longitude, start_hour, end_hour))
+
+    async def _get_hourly_forecast_async(self, latitude: float, longitude: float, start_hour: int, end_hour: int) -> str:
+        args = {"latitude": latitude, "longitude": longitude, "start_hour": start_hour, "end_hour": end_hour}
+        return _render_hourly(await self._call_tool("get_hourly_forecast", args), start_hour, end_hour)
+
+    def prefetch_forecasts(self, locations: List[Tuple[float, float]]) -> Dict[str, Any]:
+        """
+        Warm the server's gridpoint, forecast and hourly forecast caches for many
+        (latitude, longitude) pairs, e.g. every subscriber shortly before the daily run.
+
+        Returns the server's prefetch report (coverage and staleness of the
+        cached forecasts and hourly forecasts), or {"error": ...} if the call failed.
+        """
+        return asyncio.run(self._prefetch_forecasts_async(locations))
+
+    async def _prefetch_forecasts_async(self, locations: List[Tuple[float, float]]) -> Dict[str, Any]:
+        args = {"locations": [{"latitude": latitude, "longitude": longitude} for latitude, longitude in locations]}
+        content = await self._call_tool("prefetch_forecasts", args, self.batch_call_timeout)
+        try:
+            return json.loads(content)
+        except ValueError:
+            return {"error": content}
+
     def _run(self, location: str) -> str:
         """Run the weather tool synchronously"""
         return asyncio.run(self._run_async(location))
@@ -61,9 +165,22 @@ class MCPSSEWeatherTool(BaseTool):
                     longitude = float(lon_str.strip())
                     
                     # Call forecast tool
+                    # Forecast, active alerts (from the server's alerts table) and the hourly window in parallel
                     args = {"latitude": latitude, "longitude": longitude}
-                    result = await self._call_tool_with_fresh_connection("get_forecast", args)
-                    return f"Weather forecast for coordinates ({latitude}, {longitude}):\n{result}"
+                    calls = [
+                        self._call_tool("get_forecast", {**args, "format": self.forecast_format}),
+                        self._call_tool("get_point_alerts", args),
+                    ]
+                    if self.hourly_window:
+                        calls.append(self._get_hourly_forecast_async(latitude, longitude, *self.hourly_window))
+                    result, alerts, *hourly = await asyncio.gather(*calls)
+                    text = (
+                        f"Weather forecast for coordinates ({latitude}, {longitude}):\n{result}\n"
+                        f"{_render_alerts(alerts)}"
+                    )
+                    if hourly:
+                        text += f"\n{hourly[0]}"
+                    return text
                     
                 except ValueError:
                     return f"Error: Invalid coordinates format. Use 'latitude,longitude' (e.g., '39.0997,-94.5786')"
@@ -76,7 +193,7 @@ class MCPSSEWeatherTool(BaseTool):
                 
                 # Call alerts tool
                 args = {"state": state}
-                result = await self._call_tool_with_fresh_connection("get_alerts", args)
+                result = await self._call_tool("get_alerts", args)
                 return f"Weather alerts for {state}:\n{result}"
                 
         except Exception as e:
@@ -94,15 +211,11 @@ class MCPSSEWeatherTool(BaseTool):
             formatted_lon = "{:.4f}".format(float(longitude))
             location = f"{formatted_lat},{formatted_lon}"
         else:
-            # Fall back to postal code or default location
+            # Fall back to the postal code's centroid from the offline ZIP lookup,
+            # or to the default location (as main_sse does) if it is unknown
             postal_code = data.get('business_postal_code', '66213')
-            # You could add geocoding here to convert postal code to coordinates
-            # For now, use a default location based on postal code
-            if postal_code == '66213':
-                location = "38.9041,-94.6898"  # Coordinates for 66213 (formatted to 4 decimals)
-            else:
-                # Use a generic format for other postal codes
-                location = f"{postal_code}"
+            centroid = geocode_postal_code(postal_code)
+            location = "{:.4f},{:.4f}".format(*centroid) if centroid else DEFAULT_LOCATION
     
         # Now use the location for the weather API
         try:
@@ -111,6 +224,32 @@ class MCPSSEWeatherTool(BaseTool):
             return f"Error getting weather data: {str(e)}"
 
 
+def _content_text(content) -> str:
+    """Join the text parts of an MCP tool result"""
+    if isinstance(content, str):
+        return content
+    return "".join(getattr(part, 'text', '') for part in content)
+
+
+def _render_alerts(alerts) -> str:
+    """Render active alerts (a list, or the JSON text returned by get_point_alerts) as one line"""
+    if isinstance(alerts, str):
+        try:
+            alerts = json.loads(alerts)
+        except ValueError:
+            return "Active weather alerts: unavailable"
+    if not alerts:
+        return "Active weather alerts: none"
+    return "Active weather alerts: " + json.dumps(alerts, separators=(',', ':'))
+
+
+def _render_hourly(hourly: str, start_hour: int, end_hour: int) -> str:
+    """One line introducing the hourly window, followed by the server's JSON"""
+    if hourly.startswith("Error") or not hourly.startswith("{"):
+        return f"Hourly forecast {start_hour:02d}:00-{end_hour:02d}:00: unavailable"
+    return f"Hourly forecast {start_hour:02d}:00-{end_hour:02d}:00 local time today:\n{hourly}"
+
+
 # Helper function to create the tool instance
 def create_weather_tool(server_url: str = "https://ptk4g7rrkh.us-east-2.awsapprunner.com") -> MCPSSEWeatherTool:
     """Create and return a weather tool instance"""
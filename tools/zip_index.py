@@ -0,0 +1,260 @@
+"""
+Offline US ZIP code (ZCTA) centroids: O(1) geocoding and radius lookups.
+
+The dataset is a compact binary file generated from the Census Bureau ZCTA
+Gazetteer file:
+
+    python -m tools.zip_index build 2023_Gaz_zcta_national.zip data/zip_centroids.bin
+
+It holds two dense float32 arrays (latitude, longitude) addressed directly by
+the 5-digit ZIP, so a lookup is two reads at a fixed offset. The file is
+memory-mapped, which keeps it in the shared page cache rather than in each
+worker's heap.
+
+The index is opened lazily on first use and shared by every request in the
+process. Radius queries only look at the grid cells overlapping the search
+circle, so they touch a few dozen centroids at most; the grid itself is built
+on the first radius query.
+"""
+import csv
+import io
+import logging
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+import urllib.request
+import zipfile
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ZIP_CENTROIDS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'zip_centroids.bin')
+GAZETTEER_URL = "https://www2.census.gov/geo/docs/maps-data/data/gazetteer/2023_Gazetteer/2023_Gaz_zcta_national.zip"
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+# Grid cell size in degrees (~11 km north-south)
+CELL_DEGREES = 0.1
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in kilometres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def _zip_number(zip_code) -> Optional[int]:
+    """Parse '66213', '66213-1234' or 66213 into the integer ZIP"""
+    digits = str(zip_code).strip().split('-')[0]
+    if not digits.isdigit() or len(digits) > 5:
+        return None
+    return int(digits)
+
+
+def _cell(latitude: float, longitude: float, cell_degrees: float = CELL_DEGREES) -> Tuple[int, int]:
+    return math.floor(latitude / cell_degrees), math.floor(longitude / cell_degrees)
+
+
+def cells_within(latitude: float, longitude: float, radius_km: float,
+                 cell_degrees: float = CELL_DEGREES) -> List[Tuple[int, int]]:
+    """Return the (row, col) grid cells of the given size that intersect a search circle
+
+    Cells of the circle's bounding box whose nearest point is farther than
+    `radius_km` from the centre (around the corners) are left out.
+    """
+    lat_span = radius_km / KM_PER_DEGREE_LAT
+    lon_span = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(latitude)), 0.01))
+    min_row, min_col = _cell(latitude - lat_span, longitude - lon_span, cell_degrees)
+    max_row, max_col = _cell(latitude + lat_span, longitude + lon_span, cell_degrees)
+
+    cells = []
+    for row in range(min_row, max_row + 1):
+        nearest_latitude = min(max(latitude, row * cell_degrees), (row + 1) * cell_degrees)
+        for col in range(min_col, max_col + 1):
+            nearest_longitude = min(max(longitude, col * cell_degrees), (col + 1) * cell_degrees)
+            if haversine_km(latitude, longitude, nearest_latitude, nearest_longitude) <= radius_km:
+                cells.append((row, col))
+    return cells
+
+
+# File layout: header, then ZIP_SLOTS native-endian float32 latitudes, then
+# ZIP_SLOTS float32 longitudes. Slots without a ZCTA hold NaN.
+FILE_MAGIC = b'ZIPC'
+FILE_VERSION = 1
+ZIP_SLOTS = 100000
+_HEADER = struct.Struct('<4sIII')  # magic, version, slots, populated count
+
+
+class ZipCentroidIndex:
+    """Direct-addressed ZIP centroids with a grid for "ZIP codes within R km" lookups."""
+
+    def __init__(self, latitudes: Sequence[float], longitudes: Sequence[float], count: int):
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.count = count
+        self._grid: Optional[Dict[Tuple[int, int], List[int]]] = None
+        self._grid_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.count
+
+    @classmethod
+    def empty(cls) -> "ZipCentroidIndex":
+        return cls((), (), 0)
+
+    @classmethod
+    def open(cls, path: str) -> "ZipCentroidIndex":
+        """Memory-map a centroid file written by `build_centroids_file`"""
+        with open(path, 'rb') as handle:
+            mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, slots, count = _HEADER.unpack_from(mapped)
+        if magic != FILE_MAGIC or version != FILE_VERSION or slots != ZIP_SLOTS:
+            raise ValueError(f"{path} is not a version {FILE_VERSION} ZIP centroid file")
+
+        floats = memoryview(mapped)[_HEADER.size:].cast('f')
+        return cls(floats[:ZIP_SLOTS], floats[ZIP_SLOTS:2 * ZIP_SLOTS], count)
+
+    def _get_grid(self) -> Dict[Tuple[int, int], List[int]]:
+        if self._grid is None:
+            with self._grid_lock:
+                if self._grid is None:
+                    grid = {}
+                    for zip_code, latitude in enumerate(self.latitudes):
+                        if not math.isnan(latitude):
+                            grid.setdefault(_cell(latitude, self.longitudes[zip_code]), []).append(zip_code)
+                    self._grid = grid
+        return self._grid
+
+    def centroid(self, zip_code) -> Optional[Tuple[float, float]]:
+        """Return the (latitude, longitude) centroid of a ZIP code, if known"""
+        zip_code = _zip_number(zip_code)
+        if zip_code is None or not 0 <= zip_code < len(self.latitudes):
+            return None
+
+        latitude = self.latitudes[zip_code]
+        if math.isnan(latitude):
+            return None
+        return latitude, self.longitudes[zip_code]
+
+    def within(self, zip_code, radius_km: float) -> List[Tuple[int, float]]:
+        """
+        Return (zip, distance_km) pairs for the ZIP codes whose centroid lies
+        within `radius_km` of the given ZIP's centroid, nearest first.
+
+        The ZIP itself is always included, even when it is not in the dataset.
+        """
+        zip_code = _zip_number(zip_code)
+        if zip_code is None:
+            return []
+        centre = self.centroid(zip_code)
+        if centre is None or radius_km <= 0:
+            return [(zip_code, 0.0)]
+        return self.near(centre[0], centre[1], radius_km)
+
+    def near(self, latitude: float, longitude: float, radius_km: float) -> List[Tuple[int, float]]:
+        """Return (zip, distance_km) pairs within `radius_km` of a point, nearest first"""
+        grid = self._get_grid()
+        matches = []
+        for cell in cells_within(latitude, longitude, radius_km):
+            for candidate in grid.get(cell, ()):
+                distance = haversine_km(latitude, longitude, self.latitudes[candidate], self.longitudes[candidate])
+                if distance <= radius_km:
+                    matches.append((candidate, distance))
+
+        matches.sort(key=lambda match: match[1])
+        return matches
+
+
+_index: Optional[ZipCentroidIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_zip_index() -> ZipCentroidIndex:
+    """Return the process-wide ZIP index, loading it on first use.
+
+    A missing dataset yields an empty index: geocoding returns None and radius
+    lookups fall back to exact postal code matching.
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                path = os.environ.get('ZIP_CENTROIDS_PATH') or DEFAULT_ZIP_CENTROIDS_PATH
+                try:
+                    _index = ZipCentroidIndex.open(path)
+                    logger.info(f"Loaded {len(_index)} ZIP centroids from {path}")
+                except FileNotFoundError:
+                    logger.warning(f"ZIP centroid dataset not found at {path}; postal code lookups are disabled")
+                    _index = ZipCentroidIndex.empty()
+    return _index
+
+
+def neighbouring_postal_codes(postal_code, radius_km: float) -> List[int]:
+    """Return the postal code plus every postal code within `radius_km` of it"""
+    return [zip_code for zip_code, _ in get_zip_index().within(postal_code, radius_km)]
+
+
+def postal_code_number(postal_code) -> Optional[int]:
+    """Return the 5-digit ZIP of a postal code as an integer ('66213-1234' -> 66213), or None"""
+    return _zip_number(postal_code)
+
+
+def geocode_postal_code(postal_code) -> Optional[Tuple[float, float]]:
+    """Resolve a US postal code to its centroid (latitude, longitude) without any network call"""
+    return get_zip_index().centroid(postal_code)
+
+
+def build_centroids_file(source: str, destination: str) -> int:
+    """Convert a Census ZCTA Gazetteer file (path or URL, .txt or .zip) into the centroid file"""
+    if source.startswith(('http://', 'https://')):
+        with urllib.request.urlopen(source) as response:
+            payload = response.read()
+    else:
+        with open(source, 'rb') as handle:
+            payload = handle.read()
+
+    if source.endswith('.zip'):
+        with zipfile.ZipFile(io.BytesIO(payload)) as archive:
+            payload = archive.read(next(name for name in archive.namelist() if name.endswith('.txt')))
+
+    reader = csv.DictReader(io.StringIO(payload.decode('utf-8')), delimiter='\t')
+    # The last Gazetteer header carries trailing whitespace
+    reader.fieldnames = [name.strip() for name in reader.fieldnames]
+
+    latitudes = array('f', [math.nan]) * ZIP_SLOTS
+    longitudes = array('f', [math.nan]) * ZIP_SLOTS
+    count = 0
+    for row in reader:
+        zip_code = int(row['GEOID'])
+        latitudes[zip_code] = float(row['INTPTLAT'])
+        longitudes[zip_code] = float(row['INTPTLONG'])
+        count += 1
+
+    os.makedirs(os.path.dirname(os.path.abspath(destination)), exist_ok=True)
+    with open(destination, 'wb') as handle:
+        handle.write(_HEADER.pack(FILE_MAGIC, FILE_VERSION, ZIP_SLOTS, count))
+        latitudes.tofile(handle)
+        longitudes.tofile(handle)
+    return count
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != 'build':
+        print("Usage: python -m tools.zip_index build [gazetteer path or URL] [destination file]")
+        sys.exit(1)
+
+    source = sys.argv[2] if len(sys.argv) > 2 else GAZETTEER_URL
+    destination = sys.argv[3] if len(sys.argv) > 3 else DEFAULT_ZIP_CENTROIDS_PATH
+    count = build_centroids_file(source, destination)
+    if not count:
+        print(f"No ZIP centroids found in {source}")
+        sys.exit(1)
+    print(f"Wrote {count} ZIP centroids to {destination}")